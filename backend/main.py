@@ -3,27 +3,44 @@ TikZ Diagram Editor - Backend API
 FastAPI backend with authentication, payment, and TikZ rendering
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from pydantic import BaseModel, EmailStr, TypeAdapter
 from typing import Optional, List
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import jwt
+from jwt import PyJWTError
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 import stripe
 import os
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from cachetools import TTLCache
+import redis.asyncio as redis
 from dotenv import load_dotenv
 
-from database import SessionLocal, engine, Base
+from database import SessionLocal
 from models import User, Diagram
-from schemas import UserCreate, UserResponse, DiagramCreate, DiagramResponse, Token
+from schemas import (UserCreate, UserResponse, UserWithDiagramsResponse, DiagramCreate,
+                     DiagramResponse, DiagramSummaryResponse, Token)
 
 load_dotenv()
 
 # Initialize FastAPI app
-app = FastAPI(title="TikZ Diagram Editor API", version="1.0.0")
+app = FastAPI(
+    title="TikZ Diagram Editor API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,  # orjson encodes datetimes natively
+)
 
 # CORS middleware
 app.add_middleware(
@@ -38,33 +55,103 @@ app.add_middleware(
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+_JWT_HEADER = {"alg": ALGORITHM, "typ": "JWT"}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Argon2id password hashing - tune these to the login latency budget
+pwd_hasher = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Short-lived cache of verified tokens -> users, skips JWT decode + user lookup.
+# The generation is part of the key so user updates can invalidate every entry.
+user_cache = TTLCache(maxsize=10_000, ttl=5)
+user_cache_lock = threading.Lock()
+user_cache_generation = 0
+
+# Recently rejected tokens, refused up front without decoding or a DB query
+bad_tokens = TTLCache(maxsize=10_000, ttl=30)
+bad_tokens_lock = threading.Lock()
+
+# Recent failed logins per (client host, username); once more than
+# MAX_FAILED_LOGINS have failed, login is rejected before any password
+# hashing work is done
+MAX_FAILED_LOGINS = 5
+failed_logins = TTLCache(maxsize=100_000, ttl=60)
+failed_logins_lock = threading.Lock()
+
+# Validate/serialize diagrams in one pydantic-core pass; routes using these
+# return plain data with response_model=None so FastAPI doesn't validate again
+_DIAGRAM_LIST_ADAPTER = TypeAdapter(List[DiagramSummaryResponse])
+_DIAGRAM_ADAPTER = TypeAdapter(DiagramResponse)
+
+
+def dump_diagram(diagram):
+    """Serialize a Diagram row to JSON-ready data"""
+    return _DIAGRAM_ADAPTER.dump_python(
+        _DIAGRAM_ADAPTER.validate_python(diagram, from_attributes=True), mode="json"
+    )
+
+# Shared user cache across workers (optional) - consulted when the
+# in-process cache misses, before falling back to the database
+REDIS_URL = os.getenv("REDIS_URL", "")
+USER_REDIS_TTL = 60
+redis_client = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+
 # Stripe configuration
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "")
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+
+# Argon2 is CPU-bound by design - hash in a process pool sized to the cores
+# so login bursts neither block the event loop nor serialize on the GIL
+password_pool = None
+
+
+@app.on_event("startup")
+def start_password_pool():
+    global password_pool
+    password_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    password_pool.shutdown()
 
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Authentication helpers
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def _verify_password_sync(plain_password, hashed_password):
+    try:
+        return pwd_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def _hash_password_sync(password):
+    return pwd_hasher.hash(password)
+
+
+async def verify_password(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_pool, _verify_password_sync, plain_password, hashed_password
+    )
+
 
+async def get_password_hash(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_pool, _hash_password_sync, password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+
+def password_needs_rehash(hashed_password):
+    return pwd_hasher.check_needs_rehash(hashed_password)
+
+
+# Verified against on unknown usernames so both failure paths cost the same
+DUMMY_PASSWORD_HASH = _hash_password_sync("dummy-password")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -74,29 +161,108 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM, headers=_JWT_HEADER)
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def invalidate_user_cache():
+    """Drop all cached users, e.g. after a user's premium status changes"""
+    global user_cache_generation
+    with user_cache_lock:
+        user_cache_generation += 1
+
+
+def remember_bad_token(token_hash):
+    with bad_tokens_lock:
+        bad_tokens[token_hash] = True
+
+
+async def get_redis_user(username):
+    """Look up a cached user in Redis, None on miss or if Redis is unavailable"""
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(f"user:{username}")
+    except redis.RedisError:
+        return None
+    return UserResponse.model_validate_json(cached) if cached else None
+
+
+async def set_redis_user(user):
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(f"user:{user.username}", USER_REDIS_TTL, user.model_dump_json())
+    except redis.RedisError:
+        pass
+
+
+async def delete_redis_user(username):
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(f"user:{username}")
+    except redis.RedisError:
+        pass
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    token_hash = hashlib.sha256(token.encode()).digest()
+    cache_key = (user_cache_generation, token_hash)
+    with user_cache_lock:
+        cached_user = user_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    with bad_tokens_lock:
+        if token_hash in bad_tokens:
+            raise credentials_exception
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
+            remember_bad_token(token_hash)
             raise credentials_exception
-    except JWTError:
+    except PyJWTError:
+        remember_bad_token(token_hash)
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    user = await get_redis_user(username)
     if user is None:
-        raise credentials_exception
+        # Plain column row instead of an ORM entity, validated into the
+        # response schema so cached users are independent of any session
+        result = await db.execute(
+            select(User.id, User.username, User.email, User.is_premium, User.created_at)
+            .where(User.username == username)
+        )
+        row = result.first()
+        if row is None:
+            remember_bad_token(token_hash)
+            raise credentials_exception
+        user = UserResponse.model_validate(row)
+        await set_redis_user(user)
+    with user_cache_lock:
+        user_cache[cache_key] = user
     return user
 
 
+def etag_matches(request: Request, etag: str):
+    """Check the request's If-None-Match header against an ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def diagram_etag(diagram_id, updated_at):
+    return f'W/"{diagram_id}-{int(updated_at.timestamp() * 1_000_000)}"'
+
+
 # Routes
 @app.get("/")
 async def root():
@@ -104,41 +270,73 @@ async def root():
 
 
 @app.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
-    # Check if user exists
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    hashed_password = await get_password_hash(user.password)
+    # INSERT ... RETURNING gives back the full row in one round-trip; the
+    # unique indexes on username/email reject duplicates in the same trip
+    try:
+        result = await db.execute(
+            insert(User).values(
+                username=user.username,
+                email=user.email,
+                hashed_password=hashed_password,
+                is_premium=False
+            ).returning(User)
+        )
+        db_user = result.scalar_one()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # SQLite reports "users.username", Postgres the "ix_users_username" index
+        message = str(e.orig)
+        if "users.username" in message or "ix_users_username" in message:
+            raise HTTPException(status_code=400, detail="Username already registered")
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password,
-        is_premium=False
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
     return db_user
 
 
 @app.post("/token", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
     """Login and get access token"""
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
+    login_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Incorrect username or password",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    attempt_key = (request.client.host if request.client else "", form_data.username)
+    with failed_logins_lock:
+        failures = failed_logins.get(attempt_key, 0)
+    if failures > MAX_FAILED_LOGINS:
+        raise login_exception
+    
+    result = await db.execute(
+        select(User.id, User.username, User.hashed_password).where(User.username == form_data.username)
+    )
+    user = result.first()
+    if user:
+        password_ok = await verify_password(form_data.password, user.hashed_password)
+    else:
+        await verify_password(form_data.password, DUMMY_PASSWORD_HASH)
+        password_ok = False
+    if not password_ok:
+        with failed_logins_lock:
+            failed_logins[attempt_key] = failed_logins.get(attempt_key, 0) + 1
+        raise login_exception
+    with failed_logins_lock:
+        failed_logins.pop(attempt_key, None)
+    
+    # Upgrade stored hash if the hasher parameters have changed
+    if password_needs_rehash(user.hashed_password):
+        new_hash = await get_password_hash(form_data.password)
+        await db.execute(
+            update(User).where(User.id == user.id).values(hashed_password=new_hash)
         )
+        await db.commit()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -146,95 +344,135 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.get("/users/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+@app.get("/users/me", response_model=None, responses={200: {"model": UserResponse}})
+async def read_users_me(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get current user information"""
-    return current_user
+    etag = f'W/"{current_user.id}-{int(current_user.is_premium)}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    # Already a validated UserResponse
+    return current_user.model_dump(mode="json")
+
+
+@app.get("/users/me/with-diagrams", response_model=UserWithDiagramsResponse)
+async def read_users_me_with_diagrams(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get current user information together with all their diagrams"""
+    result = await db.execute(
+        select(User).options(selectinload(User.diagrams)).where(User.id == current_user.id)
+    )
+    return result.scalar_one()
 
 
-@app.post("/diagrams", response_model=DiagramResponse)
+@app.post("/diagrams", response_model=None, responses={200: {"model": DiagramResponse}})
 async def create_diagram(
     diagram: DiagramCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new diagram"""
-    db_diagram = Diagram(
-        title=diagram.title,
-        tikz_code=diagram.tikz_code,
-        user_id=current_user.id
+    result = await db.execute(
+        insert(Diagram).values(**diagram.model_dump(), user_id=current_user.id).returning(Diagram)
     )
-    db.add(db_diagram)
-    db.commit()
-    db.refresh(db_diagram)
-    return db_diagram
+    db_diagram = result.scalar_one()
+    await db.commit()
+    return dump_diagram(db_diagram)
 
 
-@app.get("/diagrams", response_model=List[DiagramResponse])
+@app.get("/diagrams", response_model=None, responses={200: {"model": List[DiagramSummaryResponse]}})
 async def get_diagrams(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all diagrams for current user"""
-    diagrams = db.query(Diagram).filter(Diagram.user_id == current_user.id).all()
-    return diagrams
+    """Get all diagrams for current user (without their TikZ code)"""
+    result = await db.execute(
+        select(Diagram.id, Diagram.title, Diagram.user_id, Diagram.created_at, Diagram.updated_at)
+        .where(Diagram.user_id == current_user.id)
+    )
+    diagrams = _DIAGRAM_LIST_ADAPTER.validate_python(result.all(), from_attributes=True)
+    return _DIAGRAM_LIST_ADAPTER.dump_python(diagrams, mode="json")
 
 
-@app.get("/diagrams/{diagram_id}", response_model=DiagramResponse)
+@app.get("/diagrams/{diagram_id}", response_model=None, responses={200: {"model": DiagramResponse}})
 async def get_diagram(
     diagram_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific diagram"""
-    diagram = db.query(Diagram).filter(
+    # Revalidation only needs updated_at - don't load tikz_code for a 304
+    if request.headers.get("if-none-match"):
+        result = await db.execute(select(Diagram.updated_at).where(
+            Diagram.id == diagram_id,
+            Diagram.user_id == current_user.id
+        ))
+        updated_at = result.scalar_one_or_none()
+        if updated_at is not None:
+            etag = diagram_etag(diagram_id, updated_at)
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+    
+    result = await db.execute(select(Diagram).where(
         Diagram.id == diagram_id,
         Diagram.user_id == current_user.id
-    ).first()
+    ))
+    diagram = result.scalar_one_or_none()
     if not diagram:
         raise HTTPException(status_code=404, detail="Diagram not found")
-    return diagram
+    response.headers["ETag"] = diagram_etag(diagram.id, diagram.updated_at)
+    return dump_diagram(diagram)
 
 
-@app.put("/diagrams/{diagram_id}", response_model=DiagramResponse)
+@app.put("/diagrams/{diagram_id}", response_model=None, responses={200: {"model": DiagramResponse}})
 async def update_diagram(
     diagram_id: int,
     diagram: DiagramCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a diagram"""
-    db_diagram = db.query(Diagram).filter(
+    result = await db.execute(select(Diagram).where(
         Diagram.id == diagram_id,
         Diagram.user_id == current_user.id
-    ).first()
+    ))
+    db_diagram = result.scalar_one_or_none()
     if not db_diagram:
         raise HTTPException(status_code=404, detail="Diagram not found")
     
     db_diagram.title = diagram.title
     db_diagram.tikz_code = diagram.tikz_code
     db_diagram.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_diagram)
-    return db_diagram
+    await db.commit()
+    await db.refresh(db_diagram)
+    return dump_diagram(db_diagram)
 
 
 @app.delete("/diagrams/{diagram_id}")
 async def delete_diagram(
     diagram_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a diagram"""
-    diagram = db.query(Diagram).filter(
+    result = await db.execute(select(Diagram).where(
         Diagram.id == diagram_id,
         Diagram.user_id == current_user.id
-    ).first()
+    ))
+    diagram = result.scalar_one_or_none()
     if not diagram:
         raise HTTPException(status_code=404, detail="Diagram not found")
     
-    db.delete(diagram)
-    db.commit()
+    await db.delete(diagram)
+    await db.commit()
     return {"message": "Diagram deleted successfully"}
 
 
@@ -258,14 +496,16 @@ async def render_tikz(tikz_code: str, current_user: User = Depends(get_current_u
 @app.post("/subscription/create-checkout-session")
 async def create_checkout_session(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create Stripe checkout session for premium subscription"""
     if not stripe.api_key:
         raise HTTPException(status_code=500, detail="Stripe not configured")
     
     try:
-        checkout_session = stripe.checkout.Session.create(
+        # The Stripe SDK is blocking - run it on the threadpool, not the event loop
+        checkout_session = await asyncio.to_thread(
+            stripe.checkout.Session.create,
             customer_email=current_user.email,
             payment_method_types=['card'],
             line_items=[{
@@ -293,8 +533,22 @@ async def create_checkout_session(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def mark_user_premium(user_id: int):
+    """Upgrade a user to premium after a completed checkout"""
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(User).where(User.id == user_id).values(is_premium=True)
+            .returning(User.username)
+        )
+        username = result.scalar_one_or_none()
+        await db.commit()
+    if username is not None:
+        invalidate_user_cache()
+        await delete_redis_user(username)
+
+
 @app.post("/subscription/webhook")
-async def stripe_webhook(request: Request):
+async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
     """Handle Stripe webhook events"""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
@@ -312,13 +566,8 @@ async def stripe_webhook(request: Request):
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
         user_id = session['metadata']['user_id']
-        # Update user to premium
-        db = SessionLocal()
-        user = db.query(User).filter(User.id == int(user_id)).first()
-        if user:
-            user.is_premium = True
-            db.commit()
-        db.close()
+        # Update user to premium after responding - Stripe only needs a fast ack
+        background_tasks.add_task(mark_user_premium, int(user_id))
     
     return {"status": "success"}
 
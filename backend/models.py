@@ -2,7 +2,7 @@
 Database models
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -18,7 +18,8 @@ class User(Base):
     is_premium = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    diagrams = relationship("Diagram", back_populates="owner")
+    # Load explicitly (selectinload) - accidental lazy loads raise instead of N+1
+    diagrams = relationship("Diagram", back_populates="owner", lazy="raise")
 
 
 class Diagram(Base):
@@ -32,4 +33,9 @@ class Diagram(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     owner = relationship("User", back_populates="diagrams")
+    
+    # Per-user lookups filter on user_id (and id) - serve them from one index
+    __table_args__ = (
+        Index("ix_diagrams_user_id_id", "user_id", "id"),
+    )
 
@@ -2,8 +2,8 @@
 Pydantic schemas for request/response validation
 """
 
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, EmailStr
+from typing import Optional, List
 from datetime import datetime
 
 
@@ -20,8 +20,7 @@ class UserResponse(BaseModel):
     is_premium: bool
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class DiagramCreate(BaseModel):
@@ -37,8 +36,21 @@ class DiagramResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DiagramSummaryResponse(BaseModel):
+    id: int
+    title: str
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UserWithDiagramsResponse(UserResponse):
+    diagrams: List[DiagramResponse]
 
 
 class Token(BaseModel):
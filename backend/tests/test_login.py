@@ -0,0 +1,72 @@
+"""
+Tests for the failed-login limit on the /token endpoint
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Use a throwaway SQLite database; must be set before database.py is imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+from fastapi.testclient import TestClient
+
+import main
+from database import Base, engine
+
+
+async def create_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+class LoginLimitTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(main.app)
+        cls.client.__enter__()
+        cls.client.portal.call(create_schema)
+        response = cls.client.post(
+            "/register",
+            json={"username": "alice", "email": "alice@example.com", "password": "secret"},
+        )
+        assert response.status_code == 200, response.text
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+
+    def setUp(self):
+        main.failed_logins.clear()
+
+    def login(self, password):
+        return self.client.post("/token", data={"username": "alice", "password": password})
+
+    def test_login_allowed_after_exactly_max_failures(self):
+        for _ in range(main.MAX_FAILED_LOGINS):
+            self.assertEqual(self.login("wrong").status_code, 401)
+        self.assertEqual(self.login("secret").status_code, 200)
+
+    def test_login_rejected_without_hashing_past_max_failures(self):
+        for _ in range(main.MAX_FAILED_LOGINS + 1):
+            self.assertEqual(self.login("wrong").status_code, 401)
+        with mock.patch.object(main, "verify_password") as verify_password:
+            self.assertEqual(self.login("secret").status_code, 401)
+        verify_password.assert_not_called()
+
+    def test_successful_login_resets_failures(self):
+        for _ in range(main.MAX_FAILED_LOGINS):
+            self.login("wrong")
+        self.assertEqual(self.login("secret").status_code, 200)
+        for _ in range(main.MAX_FAILED_LOGINS):
+            self.assertEqual(self.login("wrong").status_code, 401)
+        self.assertEqual(self.login("secret").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
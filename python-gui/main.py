@@ -8,14 +8,136 @@ import re
 import subprocess
 import tempfile
 import os
+import logging
+import traceback
 from pathlib import Path
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QTextEdit, QPushButton, QLabel, 
                              QSplitter, QMessageBox, QFileDialog, QMenuBar, 
                              QMenu, QAction, QStatusBar, QSpinBox, QCheckBox)
-from PyQt5.QtCore import Qt, QPoint, QRect, pyqtSignal, QTimer
-from PyQt5.QtGui import QPainter, QPen, QBrush, QColor, QFont, QPixmap, QImage
+from PyQt5.QtCore import (Qt, QLine, QPoint, QPointF, QRect, pyqtSignal, QTimer,
+                          QObject, QRunnable, QThreadPool)
+from PyQt5.QtGui import (QPainter, QPen, QBrush, QColor, QFont, QFontMetrics, QPixmap,
+                         QPixmapCache, QImage, QStaticText)
+import copy
+import heapq
 import math
+import numpy as np
+from collections import OrderedDict, defaultdict, deque
+
+
+log = logging.getLogger(__name__)
+
+# Precompiled patterns used while parsing TikZ code
+_TEXTBF_RE = re.compile(r'\\textbf\{([^}]+)\}')
+_TEXTBF_BARE_RE = re.compile(r'\\textbf([^{])')
+_SMALL_RE = re.compile(r'\\+small\s*')
+_DBL_BSLASH_RE = re.compile(r'\\\\(?!\\)')
+_LATEX_CMD_BRACE_RE = re.compile(r'\\[a-zA-Z]+\{([^}]*)\}')
+_LATEX_CMD_RE = re.compile(r'\\[a-zA-Z]+\s*')
+_AT_RE = re.compile(r'at\s*\(([^)]+)\)')
+_RELATIVE_RE = re.compile(r'(above|below|left|right)=of\s+(\w+)')
+_XSHIFT_RE = re.compile(r'xshift=([-\d.]+)cm')
+_YSHIFT_RE = re.compile(r'yshift=([-\d.]+)cm')
+_DRAW_RE = re.compile(r'\\draw\[([^\]]*)\]\s*\(([^)]+)\)\s*--\s*\(([^)]+)\)')
+_FIT_RE = re.compile(r'fit\s*=\s*\(([^)]+)\)')
+_PAREN_NAME_RE = re.compile(r'\(([^)]+)\)')
+_SPLIT_RE = re.compile(r'[,\s]+')
+_INNER_SEP_RE = re.compile(r'inner\s+sep=([\d.]+)cm')
+_BRACE_RE = re.compile(r'[{}]')
+_NODE_START_RE = re.compile(r'\\node\[')
+
+# Precompiled patterns used while exporting
+_FIT_NODE_RE = re.compile(r'\\node\[([^\]]*)\]\s*\(([^)]+)\)\s*fit=\(([^)]+)\)')
+_BRACED_TEXT_RE = re.compile(r'\{([^}]*)\}')
+# \node[style] (name) options {text...: style, name, options before the text, text from its first brace
+_NODE_LINE_RE = re.compile(r'\\node\[([^\]]*)\]\s*\(([^)]+)\)\s*([^{]*?)\s*(\{.*)?$')
+_AT_POSITION_RE = re.compile(r'\s+at\s*\([^)]+\)')
+_NAME_BEFORE_TEXT_RE = re.compile(r'(\([^)]+\))\s*(\{)')
+_NAME_BEFORE_SEMICOLON_RE = re.compile(r'(\([^)]+\))\s*;')
+_RELATIVE_OPTION_RE = re.compile(r',\s*(?:(?:above|below|left|right)=of\s+[\w-]+|[xy]shift=[^,{]+)')
+_LEADING_SEPARATORS_RE = re.compile(r'^[\s,]+')
+# Lines copied through export unchanged: style definitions, then scopes, labels and background grouping
+_STYLE_LINE_RE = re.compile(r'/\.style=|node distance=')
+_PRESERVED_LINE_RE = re.compile(
+    r'\\begin\{scope\}|\\end\{scope\}|\\node\[font=|\\draw\[arrow|\\draw\[dashed'
+    r'|on background layer|fit='
+)
+
+# Precompiled patterns used while painting
+_FILL_COLOR_RE = re.compile(r'fill=([^,}]+)')
+_DRAW_COLOR_RE = re.compile(r'draw=([^,}]+)')
+
+# Relative placements in precedence order, with the shift axis and default offset (cm)
+_RELATIVE_DEFAULTS = {
+    'above': ('y', 1.5),
+    'below': ('y', -2.0),  # Increased for better spacing
+    'left': ('x', -2.0),
+    'right': ('x', 2.0),
+}
+_RELATIVE_ORDER = list(_RELATIVE_DEFAULTS)
+
+# Quiet period after the last edit before the code is re-parsed (ms)
+REPARSE_DELAY_MS = 50
+
+# Number of recent parse results kept so undo/redo and retyping skip the parser
+PARSE_CACHE_SIZE = 16
+
+# Shortest interval between repaints driven by mouse drags and pans (about 60 Hz)
+REPAINT_INTERVAL_MS = 16
+
+# Cell size in pixels of the uniform grid used to pick nodes under the cursor
+PICK_CELL_SIZE = 128
+
+# Arrowhead strokes are the shaft direction rotated by +/-0.5 rad
+_ARROW_COS = math.cos(0.5)
+_ARROW_SIN = math.sin(0.5)
+
+# Alignment kinds reported by TikZCanvas.find_alignment_candidates, in priority order
+_ALIGNMENT_KINDS = ('horizontal', 'vertical', 'diagonal_45', 'diagonal_135')
+
+# Most alignment query results remembered per dragged node before the memo is emptied
+ALIGNMENT_MEMO_SIZE = 256
+
+# Most pens kept by TikZCanvas; widths follow the zoom, so older entries are evicted
+PEN_CACHE_SIZE = 64
+
+# Node fill colour by style type, falling back to _DEFAULT_NODE_RGB
+_NODE_RGB = {
+    "ellipse": (173, 216, 230),  # Light blue
+    "cylinder": (221, 160, 221),  # Plum
+    "dashed_rect": (144, 238, 144),  # Light green
+    "yellow_rect": (255, 255, 200),  # Light yellow
+}
+_DEFAULT_NODE_RGB = (255, 218, 185)  # Peach
+
+# TikZ style written by the simple code generator for each node style type, else "service"
+_STYLE_BY_TYPE = {
+    "ellipse": "cloud",
+    "cylinder": "db",
+    "dashed_rect": "k8s",
+    "yellow_rect": "api",
+    "rectangle": "service"
+}
+
+# Zoom label text by whole percentage for the 1.2x toolbar zoom steps between the 10% and 500% limits;
+# other levels are formatted on demand
+_ZOOM_LABELS = {percent: f"{percent}%"
+                for percent in [10, 500] + [int(1.2 ** k * 100) for k in range(-12, 9)]}
+
+# Created on first use, since font metrics need a running QApplication
+_FONT_METRICS = None
+
+
+def _font_metrics():
+    """Metrics of the bold title font, the widest font node text is drawn with"""
+    global _FONT_METRICS
+    if _FONT_METRICS is None:
+        font = QFont("Arial")
+        font.setBold(True)
+        font.setPointSize(10)
+        _FONT_METRICS = QFontMetrics(font)
+    return _FONT_METRICS
 
 
 class TikZNode:
@@ -32,6 +154,17 @@ class TikZNode:
         text_lines = [line.strip() for line in text.split('\n') if line.strip()]
         max_line_length = max([len(line) for line in text_lines]) if text_lines else 10
         
+        # Displayed lines and their extent in the title font, worked out once here
+        # rather than on every repaint
+        self._text_cache_key = None
+        self._text_lines = None
+        self._static_text_lines = None  # text lines _static_text was laid out from
+        self._static_text = None
+        metrics = _font_metrics()
+        display_lines = self.get_text_lines()
+        self.text_width = max((metrics.horizontalAdvance(line) for line in display_lines), default=0)
+        self.text_height = len(display_lines) * metrics.height()
+        
         # Adjust width and height based on content
         base_width = max(120, min(250, max_line_length * 8))
         base_height = max(50, len(text_lines) * 20 + 20)
@@ -43,15 +176,43 @@ class TikZNode:
         else:
             self.width = base_width
             self.height = base_height
+        self.half_width = self.width / 2
+        self.half_height = self.height / 2
         
+    def get_text_lines(self):
+        """Return the non-empty display lines of the text, re-cleaned only when text changes"""
+        if self._text_cache_key != self.text:
+            # Clean text one more time in case any LaTeX commands slipped through
+            clean_text = self.text
+            # Remove any remaining LaTeX commands
+            clean_text = _TEXTBF_RE.sub(r'\1', clean_text)
+            clean_text = _LATEX_CMD_BRACE_RE.sub(r'\1', clean_text)
+            clean_text = _LATEX_CMD_RE.sub('', clean_text)
+            clean_text = clean_text.replace('\\', '')
+            self._text_lines = [line.strip() for line in clean_text.split('\n') if line.strip()]
+            self._text_cache_key = self.text
+        return self._text_lines
+    
+    def get_static_text(self):
+        """Return a QStaticText per display line, keeping glyph layout between renders"""
+        text_lines = self.get_text_lines()
+        if self._static_text_lines is not text_lines:
+            self._static_text = []
+            for line in text_lines:
+                static_text = QStaticText(line)
+                static_text.setTextFormat(Qt.PlainText)
+                self._static_text.append(static_text)
+            self._static_text_lines = text_lines
+        return self._static_text
+    
     def contains_point(self, px, py):
         """Check if point is within node bounds"""
-        return (self.x - self.width/2 <= px <= self.x + self.width/2 and
-                self.y - self.height/2 <= py <= self.y + self.height/2)
+        return (self.x - self.half_width <= px <= self.x + self.half_width and
+                self.y - self.half_height <= py <= self.y + self.half_height)
     
     def get_rect(self):
         """Get bounding rectangle"""
-        return QRect(int(self.x - self.width/2), int(self.y - self.height/2),
+        return QRect(int(self.x - self.half_width), int(self.y - self.half_height),
                     int(self.width), int(self.height))
 
 
@@ -77,33 +238,161 @@ class TikZBackgroundGroup:
         self.selected = False
         self.is_resizing = False
         self.resize_handle = None  # Which corner/edge is being resized
-        
+        self._cached_style_str = None  # style_str that _cached_style was derived from
+        self._cached_style = None
+        self._bounds_cache = None  # (min_x, max_x, min_y, max_y) of the fit nodes during a node drag
+        self._handle_rects_key = None  # (rect corners, handle size) _handle_rects was built for
+        self._handle_rects = None
+    
+    # Width and height are properties so the half extents used by hit tests stay in
+    # step with every resize
+    @property
+    def width(self):
+        return self._width
+    
+    @width.setter
+    def width(self, value):
+        self._width = value
+        self.half_width = value / 2
+    
+    @property
+    def height(self):
+        return self._height
+    
+    @height.setter
+    def height(self, value):
+        self._height = value
+        self.half_height = value / 2
+    
     def contains_point(self, px, py):
         """Check if point is within box bounds"""
-        return (self.x - self.width/2 <= px <= self.x + self.width/2 and
-                self.y - self.height/2 <= py <= self.y + self.height/2)
+        return (self.x - self.half_width <= px <= self.x + self.half_width and
+                self.y - self.half_height <= py <= self.y + self.half_height)
     
     def get_rect(self):
         """Get bounding rectangle"""
-        return QRect(int(self.x - self.width/2), int(self.y - self.height/2),
+        return QRect(int(self.x - self.half_width), int(self.y - self.half_height),
                     int(self.width), int(self.height))
     
+    def cached_style(self):
+        """Return (fill_color, draw_color, is_dashed, rounded), re-derived only when style_str changes"""
+        if self._cached_style_str != self.style_str:
+            fill_color = QColor(173, 216, 230, 50)  # Default light blue with transparency
+            draw_color = QColor(100, 150, 200, 150)  # Default blue border
+            
+            # Extract fill color
+            fill_match = _FILL_COLOR_RE.search(self.style_str)
+            if fill_match:
+                fill_str = fill_match.group(1).strip()
+                # Handle color!opacity format
+                if '!' in fill_str:
+                    color_name, opacity = fill_str.split('!')
+                    opacity_val = int(opacity) if opacity.isdigit() else 20
+                    if 'blue' in color_name.lower():
+                        fill_color = QColor(173, 216, 230, int(255 * opacity_val / 100))
+                    elif 'green' in color_name.lower():
+                        fill_color = QColor(144, 238, 144, int(255 * opacity_val / 100))
+                    else:
+                        fill_color = QColor(200, 200, 200, int(255 * opacity_val / 100))
+            
+            # Extract draw color
+            draw_match = _DRAW_COLOR_RE.search(self.style_str)
+            if draw_match:
+                draw_str = draw_match.group(1).strip()
+                if 'blue' in draw_str.lower():
+                    draw_color = QColor(100, 150, 200, 200)
+                elif 'green' in draw_str.lower():
+                    draw_color = QColor(50, 150, 50, 200)
+            
+            is_dashed = 'dashed' in self.style_str
+            rounded = 'rounded corners' in self.style_str
+            self._cached_style = (fill_color, draw_color, is_dashed, rounded)
+            self._cached_style_str = self.style_str
+        return self._cached_style
+    
+    def get_handle_rects(self, rect, handle_size):
+        """Return the corner resize-handle rects around rect, rebuilt only when either changes"""
+        key = (rect.left(), rect.top(), rect.right(), rect.bottom(), handle_size)
+        if self._handle_rects_key != key:
+            offset = handle_size / 2
+            extent = int(handle_size)
+            corners = (
+                (rect.left(), rect.top()),  # NW
+                (rect.right(), rect.top()),  # NE
+                (rect.left(), rect.bottom()),  # SW
+                (rect.right(), rect.bottom()),  # SE
+            )
+            self._handle_rects = [QRect(int(hx - offset), int(hy - offset), extent, extent)
+                                  for hx, hy in corners]
+            self._handle_rects_key = key
+        return self._handle_rects
+    
     def get_resize_handle_at(self, px, py, handle_size=8):
         """Check if point is on a resize handle"""
-        handles = {
-            'nw': (self.x - self.width/2, self.y - self.height/2),  # Top-left
-            'ne': (self.x + self.width/2, self.y - self.height/2),  # Top-right
-            'sw': (self.x - self.width/2, self.y + self.height/2),  # Bottom-left
-            'se': (self.x + self.width/2, self.y + self.height/2),  # Bottom-right
-            'n': (self.x, self.y - self.height/2),  # Top
-            's': (self.x, self.y + self.height/2),  # Bottom
-            'w': (self.x - self.width/2, self.y),  # Left
-            'e': (self.x + self.width/2, self.y),  # Right
-        }
-        for handle_name, (hx, hy) in handles.items():
-            if abs(px - hx) < handle_size and abs(py - hy) < handle_size:
-                return handle_name
-        return None
+        # Handles sit on the corners and edge midpoints: resolve the column and row
+        # the point is near (edges before centre), rejecting everything else early
+        left = self.x - self.half_width
+        if abs(px - left) < handle_size:
+            horizontal = 'w'
+        elif abs(px - (self.x + self.half_width)) < handle_size:
+            horizontal = 'e'
+        elif abs(px - self.x) < handle_size:
+            horizontal = ''
+        else:
+            return None
+        
+        top = self.y - self.half_height
+        if abs(py - top) < handle_size:
+            vertical = 'n'
+        elif abs(py - (self.y + self.half_height)) < handle_size:
+            vertical = 's'
+        elif abs(py - self.y) < handle_size:
+            vertical = ''
+        else:
+            return None
+        
+        return (vertical + horizontal) or None
+
+
+def _relative_position(position_str):
+    """Return the (direction, reference) of a relative placement like below=of api, or None"""
+    # One scan finds every candidate; above > below > left > right when several appear
+    match = min(_RELATIVE_RE.finditer(position_str),
+                key=lambda m: _RELATIVE_ORDER.index(m.group(1)), default=None)
+    return (match.group(1), match.group(2).strip()) if match else None
+
+
+def _strip_relative_options(text):
+    """Remove relative placements and shifts (handling names with hyphens, underscores, etc.) from node options"""
+    # Most option text has neither; a substring test is far cheaper than the regex scan
+    if '=of' in text or 'shift=' in text:
+        text = _RELATIVE_OPTION_RE.sub('', text)
+    return _LEADING_SEPARATORS_RE.sub('', text)
+
+
+def _split_indent(line):
+    """Return (indent width, stripped text) for a source line in a single lstrip pass"""
+    lstripped = line.lstrip()
+    return len(line) - len(lstripped), lstripped.rstrip()
+
+
+def _nodes_bounds(nodes):
+    """Return (min_x, min_y, max_x, max_y) enclosing the given nodes, in one pass"""
+    min_x = min_y = math.inf
+    max_x = max_y = -math.inf
+    for n in nodes:
+        x, y = n.x, n.y
+        half_w = n.half_width
+        half_h = n.half_height
+        if x - half_w < min_x:
+            min_x = x - half_w
+        if x + half_w > max_x:
+            max_x = x + half_w
+        if y - half_h < min_y:
+            min_y = y - half_h
+        if y + half_h > max_y:
+            max_y = y + half_h
+    return min_x, min_y, max_x, max_y
 
 
 class TikZCanvas(QWidget):
@@ -111,6 +400,8 @@ class TikZCanvas(QWidget):
     
     node_selected = pyqtSignal(str)
     position_changed = pyqtSignal()
+    parsed = pyqtSignal()  # A debounced parse succeeded
+    parse_failed = pyqtSignal(str)  # A debounced parse raised; carries the error message
     
     def __init__(self):
         super().__init__()
@@ -118,6 +409,9 @@ class TikZCanvas(QWidget):
         self.connections = []
         self.background_groups = []  # Background grouping boxes
         self.selected_node = None
+        # Items selected through the canvas, so clearing the selection skips the rest
+        self._selected_nodes = set()
+        self._selected_groups = set()
         self.drag_node = None
         self.drag_group = None  # Dragging a background group
         self.drag_offset_x = 0.0  # Store as float for precision
@@ -126,6 +420,9 @@ class TikZCanvas(QWidget):
         self.snap_to_grid = False  # Toggle for grid snapping during drag
         self.grid_size = 20
         self.snap_threshold = 10  # Pixels - distance threshold for alignment snapping
+        # Nodes or groups were moved since the last parse or export; debounced parses
+        # are skipped so that they don't throw those edits away
+        self.has_unexported_edits = False
         self.alignment_guides = []  # Store alignment guides for visual feedback
         self.scale = 1.0
         self.offset_x = 0
@@ -141,8 +438,124 @@ class TikZCanvas(QWidget):
         self.pan_active = False
         self.pan_button = Qt.MiddleButton  # Middle mouse button for panning
         
+        # Rendered scene, reused until invalidate_scene() or a resize
+        self._scene_pixmap = None
+        # (zoom, device pixel ratio) the node pixmaps in QPixmapCache were rendered at, and
+        # their keys; they are removed from the cache once either changes
+        self._node_pixmap_scale = None
+        self._node_pixmap_keys = set()
+        
+        # (original_code, snap_to_grid, exported code) from the last export, dropped with the scene
+        self._export_cache = None
+        
+        # Pristine parse results keyed by source code, most recently used last
+        self._parse_cache = OrderedDict()
+        # Source code the canvas still shows unmodified, with the node list parsed from it;
+        # cleared as soon as a node or group is moved
+        self._shown_code = None
+        self._shown_nodes = None
+        
+        # Coalesces bursts of request_parse() calls into a single parse
+        self._pending_code = None
+        self._reparse_timer = QTimer(self)
+        self._reparse_timer.setSingleShot(True)
+        self._reparse_timer.setInterval(REPARSE_DELAY_MS)
+        self._reparse_timer.timeout.connect(self._do_parse)
+        
+        # Repaints from mouse moves are coalesced to at most one per REPAINT_INTERVAL_MS
+        self._repaint_timer = QTimer(self)
+        self._repaint_timer.setSingleShot(True)
+        self._repaint_timer.setInterval(REPAINT_INTERVAL_MS)
+        self._repaint_timer.timeout.connect(self.update)
+        
+        # Node geometry as parallel arrays for vectorized hit-testing and alignment,
+        # rebuilt whenever self.nodes is replaced or grows
+        self._arrays_nodes = None
+        self._nx = self._ny = self._nw = self._nh = np.empty(0)
+        self._nnames = np.empty(0, dtype=object)
+        
+        # Uniform grid of node indices for picking, rebuilt under the same rule
+        self._grid_nodes = None
+        self._grid = defaultdict(list)
+        self._grid_cells = []  # Cells each node index is currently filed under
+        
+        # Node indices binned by row, column and both diagonals for alignment queries,
+        # rebuilt under the same rule or when the bin size (from snap_threshold) changes
+        self._bins_nodes = None
+        self._bins_cell = None
+        self._bins = ({}, {}, {}, {})  # Row, column, 45-degree and 135-degree bins
+        self._bin_keys = []  # Bin keys each node index is currently filed under
+        
+        # Alignment query results by exact position, for one excluded node (normally the
+        # dragged one); they stay valid while only that node moves
+        self._align_memo = {}
+        self._align_memo_nodes = None
+        self._align_memo_state = None  # (node count, excluded index, snap_threshold)
+        self._align_memo_node = None
+        
+        # Node name -> background groups fitting it, rebuilt when the group list is
+        # replaced or a group's fit_nodes change
+        self._group_index = None
+        self._group_index_groups = None
+        
+        # Paint resources reused across frames instead of rebuilt per item
+        self._brush_by_style = {style: QBrush(QColor(*rgb)) for style, rgb in _NODE_RGB.items()}
+        self._default_brush = QBrush(QColor(*_DEFAULT_NODE_RGB))
+        self._no_brush = QBrush()
+        self._handle_brush = QBrush(QColor(255, 0, 0))
+        self._pen_cache = OrderedDict()  # (rgba, width, style) -> QPen
+        self._font_cache = {}  # (point size, bold) -> QFont
+        
+    def request_parse(self, code):
+        """Parse code once edits have been quiet for REPARSE_DELAY_MS"""
+        self._pending_code = code
+        self._reparse_timer.start()  # Restarts the countdown if already running
+    
+    def _do_parse(self):
+        code, self._pending_code = self._pending_code, None
+        if code is None or self.has_unexported_edits:
+            return
+        try:
+            self.parse_tikz_code(code)
+        except Exception as e:
+            # Half-typed code often fails to parse; an exception escaping this timer slot
+            # would abort the application
+            log.debug("Debounced parse failed: %s", e)
+            self.parse_failed.emit(str(e))
+        else:
+            self.parsed.emit()
+    
     def parse_tikz_code(self, code):
         """Parse TikZ code and extract nodes and connections"""
+        # A direct parse supersedes any pending request and any unexported edits
+        self._reparse_timer.stop()
+        self._pending_code = None
+        self.has_unexported_edits = False
+        
+        if code == self._shown_code and self.nodes is self._shown_nodes:
+            # The canvas already shows this code untouched; only the selection differs
+            # from a fresh parse
+            self._clear_selection()
+            self.original_code = code
+            self.invalidate_scene()
+            return
+        
+        # The selection belongs to the nodes and groups being replaced
+        self._selected_nodes.clear()
+        self._selected_groups.clear()
+        
+        cached = self._parse_cache.get(code)
+        if cached is not None:
+            # Copy so that dragging never mutates the cached result
+            self._parse_cache.move_to_end(code)
+            self.nodes, self.connections, self.background_groups, self.node_dict = copy.deepcopy(cached)
+            self.original_code = code
+            self._shown_code, self._shown_nodes = code, self.nodes
+            self.invalidate_scene()
+            return
+        
+        self._shown_code = self._shown_nodes = None
+        
         self.nodes = []
         self.connections = []
         self.background_groups = []  # Clear previous background groups
@@ -155,15 +568,14 @@ class TikZCanvas(QWidget):
         found_names = set()
         
         # Debug: print found nodes
-        print(f"Parsing TikZ code, looking for nodes...")
+        log.debug("Parsing TikZ code, looking for nodes...")
         
         # Find all \node[ patterns and parse manually to handle nested braces
         i = 0
-        while i < len(code):
-            # Find next \node[
-            node_start = code.find('\\node[', i)
-            if node_start == -1:
-                break
+        for node_match in _NODE_START_RE.finditer(code):
+            node_start = node_match.start()
+            if node_start < i:
+                continue  # Inside the previous node (or a skipped fragment)
             
             # Find the matching ]
             bracket_end = code.find(']', node_start)
@@ -196,54 +608,66 @@ class TikZCanvas(QWidget):
             
             # Now find the matching closing brace for the text content
             # We need to count braces to handle nested content like \textbf{AWS}\\small EC2 GPU
+            # Only brace characters are visited; the scan between them happens in C
             brace_count = 1
             text_start = brace_start + 1
-            text_end = text_start
+            text_end = None
             
-            while text_end < len(code) and brace_count > 0:
-                if code[text_end] == '{':
+            for brace in _BRACE_RE.finditer(code, text_start):
+                if brace.group() == '{':
                     brace_count += 1
-                elif code[text_end] == '}':
+                else:
                     brace_count -= 1
-                text_end += 1
+                    if brace_count == 0:
+                        text_end = brace.end()
+                        break
             
-            if brace_count == 0:
-                text = code[text_start:text_end - 1]  # Exclude the closing }
-            else:
+            if text_end is None:
                 # Didn't find matching brace, skip this node
                 i = brace_start + 1
                 continue
             
             i = text_end  # Move past this node
             
+            # Skip duplicates before slicing or cleaning their text; the brace
+            # scan above is still needed to know where the node ends
             if name in found_names:
-                continue  # Skip duplicates
+                continue
             found_names.add(name)
+            text = code[text_start:text_end - 1]  # Exclude the closing }
             
             # Store original text before cleaning
             original_text = text
             
-            print(f"  Raw node: {name}, position: '{position_str[:60]}', text: '{text[:60]}'")
+            log.debug("Raw node: %s, position: %r, text: %r", name, position_str[:60], text[:60])
             
             # Clean up text - handle LaTeX commands properly
-            # Handle \textbf{} - extract text (will be bold in rendering)
-            while '\\textbf{' in text or '\\textbf' in text:
-                text = re.sub(r'\\textbf\{([^}]+)\}', r'\1', text)
-                text = re.sub(r'\\textbf([^{])', r'\1', text)
-            # Handle \small (can be \\small or \small) - convert to newline
-            text = re.sub(r'\\+small\s*', '\n', text)
-            # Replace \\ with newline (for line breaks) - but be careful with escaped backslashes
-            # First handle double backslashes that are actual line breaks
-            text = re.sub(r'\\\\(?!\\)', '\n', text)  # Replace \\ with \n, but not \\\\
-            # Clean up any remaining LaTeX commands with braces
-            text = re.sub(r'\\[a-zA-Z]+\{([^}]*)\}', r'\1', text)
-            # Remove standalone LaTeX commands
-            text = re.sub(r'\\[a-zA-Z]+\s*', '', text)
-            # Remove any remaining single backslashes (escapes)
-            text = text.replace('\\', '')
+            # Every pattern below starts with a backslash, so plain text skips them all
+            # and each one only runs when its literal prefix is present
+            if '\\' in text:
+                # Handle \textbf{} - extract text (will be bold in rendering)
+                # (one sub pass replaces every match; looping could spin forever on
+                # a stray "\textbf{" that neither pattern consumes)
+                if '\\textbf' in text:
+                    text = _TEXTBF_RE.sub(r'\1', text)
+                    text = _TEXTBF_BARE_RE.sub(r'\1', text)
+                # Handle \small (can be \\small or \small) - convert to newline
+                if '\\small' in text:
+                    text = _SMALL_RE.sub('\n', text)
+                # Replace \\ with newline (for line breaks) - but be careful with escaped backslashes
+                # First handle double backslashes that are actual line breaks
+                if '\\\\' in text:
+                    text = _DBL_BSLASH_RE.sub('\n', text)  # Replace \\ with \n, but not \\\\
+                if '\\' in text:
+                    # Clean up any remaining LaTeX commands with braces
+                    text = _LATEX_CMD_BRACE_RE.sub(r'\1', text)
+                    # Remove standalone LaTeX commands
+                    text = _LATEX_CMD_RE.sub('', text)
+                    # Remove any remaining single backslashes (escapes)
+                    text = text.replace('\\', '')
             text = text.strip()
             
-            print(f"  Cleaned text: '{text}'")
+            log.debug("Cleaned text: %r", text)
             
             # Determine style type
             style_type = "rectangle"
@@ -263,7 +687,7 @@ class TikZCanvas(QWidget):
             yshift = 0
             
             # Check for absolute position: at (x,y)
-            at_match = re.search(r'at\s*\(([^)]+)\)', position_str)
+            at_match = _AT_RE.search(position_str)
             if at_match:
                 coords = at_match.group(1).replace('cm', '').strip()
                 parts = coords.split(',')
@@ -281,41 +705,27 @@ class TikZCanvas(QWidget):
             
             # Check for relative positioning (can be combined with absolute)
             # Use more flexible regex to handle whitespace
-            above_match = re.search(r'above=of\s+(\w+)', position_str)
-            below_match = re.search(r'below=of\s+(\w+)', position_str)
-            left_match = re.search(r'left=of\s+(\w+)', position_str)
-            right_match = re.search(r'right=of\s+(\w+)', position_str)
-            
-            if above_match:
-                relative_to = above_match.group(1).strip()
-                if yshift == 0:  # Only set default if not already set
-                    yshift = 1.5  # Default offset in cm
-                print(f"    Found above=of {relative_to}")
-            elif below_match:
-                relative_to = below_match.group(1).strip()
-                if yshift == 0:
-                    yshift = -2.0  # Default offset in cm (negative = below) - increased for better spacing
-                print(f"    Found below=of {relative_to}")
-            elif left_match:
-                relative_to = left_match.group(1).strip()
-                if xshift == 0:
-                    xshift = -2.0  # Default offset in cm (negative = left)
-                print(f"    Found left=of {relative_to}")
-            elif right_match:
-                relative_to = right_match.group(1).strip()
-                if xshift == 0:
-                    xshift = 2.0  # Default offset in cm (positive = right)
-                print(f"    Found right=of {relative_to}")
+            relative = _relative_position(position_str)
+            if relative:
+                direction, relative_to = relative
+                axis, default_shift = _RELATIVE_DEFAULTS[direction]
+                # Only set default if not already set
+                if axis == 'x':
+                    if xshift == 0:
+                        xshift = default_shift
+                elif yshift == 0:
+                    yshift = default_shift
+                log.debug("Found %s=of %s", direction, relative_to)
             
             # Parse shifts (must come AFTER relative positioning to override defaults)
-            xshift_match = re.search(r'xshift=([-\d.]+)cm', position_str)
-            yshift_match = re.search(r'yshift=([-\d.]+)cm', position_str)
+            xshift_match = _XSHIFT_RE.search(position_str)
+            yshift_match = _YSHIFT_RE.search(position_str)
             if xshift_match:
                 xshift = float(xshift_match.group(1))
-                print(f"    Found xshift: {xshift}cm = {xshift * 50}px")
+                log.debug("Found xshift: %scm = %spx", xshift, xshift * 50)
             if yshift_match:
                 yshift = float(yshift_match.group(1))
-                print(f"    Found yshift: {yshift}cm = {-yshift * 50}px")
+                log.debug("Found yshift: %scm = %spx", yshift, -yshift * 50)
             
             node_data.append({
                 'name': name,
@@ -330,10 +740,13 @@ class TikZCanvas(QWidget):
                 'original_style': style_str,  # Keep original style string
                 'original_text': original_text  # Keep original text before cleaning
             })
-            print(f"  Parsed node: {name}, x={x}, y={y}, relative_to={relative_to}, xshift={xshift*50:.1f}px, yshift={-yshift*50:.1f}px, pos='{position_str[:40]}'")
+            log.debug("Parsed node: %s, x=%s, y=%s, relative_to=%s, xshift=%.1fpx, yshift=%.1fpx, pos=%r",
+                      name, x, y, relative_to, xshift * 50, -yshift * 50, position_str[:40])
         
         # Second pass: Resolve relative positions
+        # Nodes are collected locally and published to self.nodes in one step
         node_dict = {}
+        resolved = []
         
         # First, add all nodes with absolute positions ONLY (no relative positioning)
         for data in node_data:
@@ -341,88 +754,72 @@ class TikZCanvas(QWidget):
                 # Absolute position without relative - add immediately
                 node = TikZNode(data['name'], data['x'], data['y'], data['text'], data['style_type'])
                 node_dict[data['name']] = node
-                self.nodes.append(node)
-                print(f"  Added absolute node: {data['name']} at ({data['x']}, {data['y']})")
+                resolved.append(node)
+                log.debug("Added absolute node: %s at (%s, %s)", data['name'], data['x'], data['y'])
         
-        print(f"  Initial node_dict has {len(node_dict)} nodes: {list(node_dict.keys())}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Initial node_dict has %d nodes: %s", len(node_dict), list(node_dict))
         
-        # Third pass: Resolve relative positions iteratively
-        max_iterations = 20
-        for iteration in range(max_iterations):
-            progress = False
-            unresolved = []
-            
-            print(f"\n  Iteration {iteration + 1}:")
-            for data in node_data:
+        # Third pass: Resolve relative positions in dependency order, so each node
+        # is placed exactly once, as soon as its reference node is available
+        dependents = defaultdict(list)
+        for data in node_data:
+            if data['relative_to'] and data['name'] not in node_dict:
+                dependents[data['relative_to'].strip()].append(data)
+        
+        queue = deque(node_dict)
+        while queue:
+            ref_name = queue.popleft()
+            ref_node = node_dict[ref_name]
+            for data in dependents.pop(ref_name, ()):
                 if data['name'] in node_dict:
                     continue  # Already resolved
-                
-                # If has relative_to, try to resolve
-                if data.get('relative_to'):
-                    ref_name = data['relative_to'].strip()
-                    if ref_name in node_dict:
-                        ref_node = node_dict[ref_name]
-                        # Calculate position relative to reference node
-                        # For below=of and above=of: center horizontally on reference, then apply xshift
-                        # For left=of and right=of: center vertically on reference, then apply yshift
-                        # The reference node's x,y is already its center point
-                        x = ref_node.x + data['xshift']
-                        y = ref_node.y + data['yshift']
-                        node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
-                        node_dict[data['name']] = node
-                        self.nodes.append(node)
-                        print(f"    ✓ Resolved: {data['name']} relative to '{ref_name}' -> ({x:.1f}, {y:.1f})")
-                        progress = True
-                    else:
-                        # Reference node not found yet, keep for next iteration
-                        unresolved.append(data)
-                        print(f"    ✗ Waiting: {data['name']} needs '{ref_name}' (available: {list(node_dict.keys())})")
-                elif data['x'] is not None and data['y'] is not None:
-                    # Absolute position (might have been skipped if it also had relative_to)
-                    node = TikZNode(data['name'], data['x'], data['y'], data['text'], data['style_type'])
-                    node_dict[data['name']] = node
-                    self.nodes.append(node)
-                    print(f"    ✓ Added absolute: {data['name']} at ({data['x']}, {data['y']})")
-                    progress = True
-                else:
-                    unresolved.append(data)
-                    print(f"    ✗ No position info for: {data['name']}")
-            
-            if not progress:
-                print(f"  No progress in iteration {iteration + 1}, stopping")
-                break
-            if not unresolved:
-                print(f"  All nodes resolved in iteration {iteration + 1}!")
-                break
+                # Calculate position relative to reference node
+                # For below=of and above=of: center horizontally on reference, then apply xshift
+                # For left=of and right=of: center vertically on reference, then apply yshift
+                # The reference node's x,y is already its center point
+                x = ref_node.x + data['xshift']
+                y = ref_node.y + data['yshift']
+                node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
+                node_dict[data['name']] = node
+                resolved.append(node)
+                queue.append(data['name'])
+                log.debug("Resolved: %s relative to %r -> (%.1f, %.1f)", data['name'], ref_name, x, y)
+        
+        # Autolayout snaps against the nodes placed so far, so publish them first
+        self.nodes.extend(resolved)
+        
+        # Whatever is left has a missing or cyclic reference, or no position at all
+        unresolved = [data for data in node_data if data['name'] not in node_dict]
         
         # If still unresolved, use smart autolayout
         if unresolved:
-            print(f"\n  Applying smart autolayout for {len(unresolved)} unresolved nodes...")
+            log.debug("Applying smart autolayout for %d unresolved nodes...", len(unresolved))
             self._apply_autolayout(unresolved, node_dict, node_data)
         
         # Store node dict for connection resolution
         self.node_dict = node_dict
         
-        print(f"\nSummary: Found {len(node_data)} node definitions, resolved {len(self.nodes)} nodes")
-        print(f"Resolved node names: {[n.name for n in self.nodes]}")
-        print(f"Available reference nodes in dict: {list(node_dict.keys())}")
+        log.debug("Summary: Found %d node definitions, resolved %d nodes", len(node_data), len(self.nodes))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Resolved node names: %s", [n.name for n in self.nodes])
+            log.debug("Available reference nodes in dict: %s", list(node_dict))
         
         # Check for unresolved nodes with relative positioning
         unresolved_with_ref = [d for d in node_data if d['name'] not in node_dict and d['relative_to']]
         if unresolved_with_ref:
-            print(f"\nWARNING: {len(unresolved_with_ref)} nodes with relative positioning could not be resolved:")
+            log.warning("%d nodes with relative positioning could not be resolved:", len(unresolved_with_ref))
             for d in unresolved_with_ref:
-                print(f"  - {d['name']} (relative_to: '{d['relative_to']}') - reference node not found!")
+                log.warning("  - %s (relative_to: %r) - reference node not found!", d['name'], d['relative_to'])
         
         # Extract connections
-        arrow_pattern = r'\\draw\[([^\]]*)\]\s*\(([^)]+)\)\s*--\s*\(([^)]+)\)'
-        for match in re.finditer(arrow_pattern, code):
+        for match in _DRAW_RE.finditer(code):
             style = match.group(1)
             from_name = match.group(2)
             to_name = match.group(3)
             
-            from_node = next((n for n in self.nodes if n.name == from_name), None)
-            to_node = next((n for n in self.nodes if n.name == to_name), None)
+            from_node = node_dict.get(from_name)
+            to_node = node_dict.get(to_name)
             
             if from_node and to_node:
                 conn_style = "dashed" if "dashed" in style else "arrow"
@@ -431,11 +828,17 @@ class TikZCanvas(QWidget):
         # Parse background groups (fit nodes) after all nodes are resolved
         self._parse_background_groups(code)
         
-        self.update()
+        # Deep-copy as one tuple so connections and node_dict keep pointing at the copied nodes
+        self._parse_cache[code] = copy.deepcopy((self.nodes, self.connections, self.background_groups, self.node_dict))
+        if len(self._parse_cache) > PARSE_CACHE_SIZE:
+            self._parse_cache.popitem(last=False)
+        self._shown_code, self._shown_nodes = code, self.nodes
+        
+        self.invalidate_scene()
     
     def _parse_background_groups(self, code):
         """Parse background grouping boxes (fit nodes) from TikZ code"""
-        print(f"  Parsing background groups...")
+        log.debug("Parsing background groups...")
         # Find scope blocks with on background layer
         scope_start = 0
         scope_count = 0
@@ -451,76 +854,73 @@ class TikZCanvas(QWidget):
                 break
             
             scope_content = code[scope_start:scope_end]
-            print(f"  Found scope block {scope_count}, checking for 'on background layer'...")
+            log.debug("Found scope block %d, checking for 'on background layer'...", scope_count)
             
             if 'on background layer' in scope_content:
-                print(f"  Scope {scope_count} has 'on background layer'")
+                log.debug("Scope %d has 'on background layer'", scope_count)
                 # Find fit nodes in this scope
                 # Pattern: fit= can be in style brackets: \node[..., fit=(nodes), ...] (name) {...}
                 # OR after node name: \node[...] (name) fit=(nodes) {...}
                 
                 # First, find all \node[ patterns in the scope
-                node_start = 0
-                while True:
-                    node_start = scope_content.find('\\node[', node_start)
-                    if node_start == -1:
-                        break
+                next_start = 0
+                for node_match in _NODE_START_RE.finditer(scope_content):
+                    if node_match.start() < next_start:
+                        continue  # Inside the previous node's style
                     
                     # Find the matching closing bracket for style
-                    bracket_start = node_start + 6  # Skip "\node["
+                    bracket_start = node_match.end()  # Skip "\node["
                     bracket_end = scope_content.find(']', bracket_start)
                     if bracket_end == -1:
-                        node_start += 1
-                        continue
+                        break  # No later node can close its style either
                     
                     style_str = scope_content[bracket_start:bracket_end]
                     
                     # Check if fit= is in the style string
-                    fit_match = re.search(r'fit\s*=\s*\(([^)]+)\)', style_str)
+                    fit_match = _FIT_RE.search(style_str)
                     if fit_match:
                         fit_nodes_str = fit_match.group(1)
                         
                         # Find the node name after the style bracket
                         name_start = scope_content.find('(', bracket_end)
                         if name_start == -1:
-                            node_start = bracket_end + 1
+                            next_start = bracket_end + 1
                             continue
                         name_end = scope_content.find(')', name_start)
                         if name_end == -1:
-                            node_start = bracket_end + 1
+                            next_start = bracket_end + 1
                             continue
                         
                         name = scope_content[name_start + 1:name_end]
                         
-                        print(f"    Found fit node: {name}, fit_nodes_str: '{fit_nodes_str}'")
+                        log.debug("Found fit node: %s, fit_nodes_str: %r", name, fit_nodes_str)
                         
                         # Parse fit node names (can be space or comma separated, with parentheses)
                         # Handle format: (api) (orchestrator) (chat) or api, orchestrator, chat
                         fit_nodes = []
                         # Try to extract node names from parentheses first
-                        paren_matches = re.findall(r'\(([^)]+)\)', fit_nodes_str)
+                        paren_matches = _PAREN_NAME_RE.findall(fit_nodes_str)
                         if paren_matches:
                             fit_nodes = [n.strip() for n in paren_matches if n.strip()]
                         else:
                             # Fallback: split by comma or space
-                            fit_nodes = [n.strip() for n in re.split(r'[,\s]+', fit_nodes_str) if n.strip()]
+                            fit_nodes = [n.strip() for n in _SPLIT_RE.split(fit_nodes_str) if n.strip()]
                         
                         # Extract inner_sep if present
-                        inner_sep_match = re.search(r'inner\s+sep=([\d.]+)cm', style_str)
+                        inner_sep_match = _INNER_SEP_RE.search(style_str)
                         inner_sep = float(inner_sep_match.group(1)) if inner_sep_match else 0.3
                         
                         # Calculate bounding box from fit nodes
                         if fit_nodes:
                             # Find all referenced nodes
-                            referenced_nodes = [n for n in self.nodes if n.name in fit_nodes]
-                            print(f"    Found {len(referenced_nodes)}/{len(fit_nodes)} referenced nodes: {[n.name for n in referenced_nodes]}")
+                            referenced_nodes = [self.node_dict[n] for n in fit_nodes if n in self.node_dict]
+                            if log.isEnabledFor(logging.DEBUG):
+                                log.debug("Found %d/%d referenced nodes: %s", len(referenced_nodes), len(fit_nodes),
+                                          [n.name for n in referenced_nodes])
                             
                             if referenced_nodes:
                                 # Calculate bounding box
-                                min_x = min(n.x - n.width/2 for n in referenced_nodes)
-                                max_x = max(n.x + n.width/2 for n in referenced_nodes)
-                                min_y = min(n.y - n.height/2 for n in referenced_nodes)
-                                max_y = max(n.y + n.height/2 for n in referenced_nodes)
+                                min_x, min_y, max_x, max_y = _nodes_bounds(referenced_nodes)
                                 
                                 # Add inner_sep padding (convert cm to pixels: 1cm = 50px)
                                 padding = inner_sep * 50
@@ -541,130 +941,116 @@ class TikZCanvas(QWidget):
                                     inner_sep=inner_sep
                                 )
                                 self.background_groups.append(bg_group)
-                                print(f"  ✓ Parsed background group: {name} fitting {fit_nodes} at ({center_x:.1f}, {center_y:.1f}), size ({width:.1f}, {height:.1f})")
+                                log.debug("Parsed background group: %s fitting %s at (%.1f, %.1f), size (%.1f, %.1f)",
+                                          name, fit_nodes, center_x, center_y, width, height)
                             else:
-                                print(f"  ✗ No referenced nodes found for fit nodes: {fit_nodes}")
-                                print(f"    Available node names: {[n.name for n in self.nodes]}")
+                                log.debug("No referenced nodes found for fit nodes: %s", fit_nodes)
+                                if log.isEnabledFor(logging.DEBUG):
+                                    log.debug("Available node names: %s", [n.name for n in self.nodes])
                         else:
-                            print(f"  ✗ No fit nodes parsed from: '{fit_nodes_str}'")
+                            log.debug("No fit nodes parsed from: %r", fit_nodes_str)
                     
-                    node_start = bracket_end + 1
+                    next_start = bracket_end + 1
             
             scope_start = scope_end + 1
         
-        print(f"  Total background groups parsed: {len(self.background_groups)}")
+        log.debug("Total background groups parsed: %d", len(self.background_groups))
     
     def _apply_autolayout(self, unresolved, node_dict, all_node_data):
         """Apply smart autolayout for unresolved nodes based on their relationships"""
-        # Try to resolve based on position_str parsing and relationships
+        # Try to resolve based on position_str parsing and relationships, over at most
+        # max_iterations passes
         max_iterations = 10
-        for iteration in range(max_iterations):
-            progress = False
-            still_unresolved = []
-            
-            for data in unresolved:
-                if data['name'] in node_dict:
-                    continue
-                
-                # First, try to parse relative positioning from position_str if relative_to wasn't set
-                if not data.get('relative_to') and data.get('position_str'):
-                    pos_str = data['position_str']
-                    # Try to extract relative positioning
-                    above_match = re.search(r'above=of\s+(\w+)', pos_str)
-                    below_match = re.search(r'below=of\s+(\w+)', pos_str)
-                    left_match = re.search(r'left=of\s+(\w+)', pos_str)
-                    right_match = re.search(r'right=of\s+(\w+)', pos_str)
-                    
-                    ref_name = None
-                    if above_match:
-                        ref_name = above_match.group(1).strip()
-                        if 'yshift' not in data or data.get('yshift', 0) == 0:
-                            data['yshift'] = 75  # 1.5cm default in pixels
-                    elif below_match:
-                        ref_name = below_match.group(1).strip()
-                        if 'yshift' not in data or data.get('yshift', 0) == 0:
-                            data['yshift'] = -100  # -2.0cm default in pixels
-                    elif left_match:
-                        ref_name = left_match.group(1).strip()
-                        if 'xshift' not in data or data.get('xshift', 0) == 0:
-                            data['xshift'] = -100  # -2.0cm default in pixels
-                    elif right_match:
-                        ref_name = right_match.group(1).strip()
-                        if 'xshift' not in data or data.get('xshift', 0) == 0:
-                            data['xshift'] = 100  # 2.0cm default in pixels
-                    
-                    # Parse shifts from position string
-                    xshift_match = re.search(r'xshift=([-\d.]+)cm', pos_str)
-                    yshift_match = re.search(r'yshift=([-\d.]+)cm', pos_str)
-                    if xshift_match:
-                        data['xshift'] = float(xshift_match.group(1)) * 50
-                    if yshift_match:
-                        data['yshift'] = -float(yshift_match.group(1)) * 50
-                    
-                    if ref_name:
-                        data['relative_to'] = ref_name
-                        print(f"    Parsed relative positioning: {data['name']} -> {ref_name}")
-                
-                # Try to find reference node by name matching
-                if data.get('relative_to'):
-                    ref_name = data['relative_to'].strip()
-                    # Try exact match first
-                    if ref_name in node_dict:
-                        ref_node = node_dict[ref_name]
-                        x = ref_node.x + data.get('xshift', 0)
-                        y = ref_node.y + data.get('yshift', 0)
-                        # Snap to grid with alignment
-                        x, y = self._snap_autolayout_position(x, y)
-                        node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
-                        node_dict[data['name']] = node
-                        self.nodes.append(node)
-                        print(f"    ✓ Autolayout resolved: {data['name']} relative to '{ref_name}' -> ({x:.1f}, {y:.1f})")
-                        progress = True
-                        continue
-                    # Try case-insensitive match
-                    for existing_name in node_dict.keys():
-                        if existing_name.lower() == ref_name.lower():
-                            ref_node = node_dict[existing_name]
-                            x = ref_node.x + data.get('xshift', 0)
-                            y = ref_node.y + data.get('yshift', 0)
-                            # Snap to grid with alignment
-                            x, y = self._snap_autolayout_position(x, y)
-                            node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
-                            node_dict[data['name']] = node
-                            self.nodes.append(node)
-                            print(f"    ✓ Autolayout resolved (case-insensitive): {data['name']} relative to '{existing_name}' -> ({x:.1f}, {y:.1f})")
-                            progress = True
-                            break
-                    if data['name'] in node_dict:
-                        continue
+        unresolved = [data for data in unresolved if data['name'] not in node_dict]
+        # Index incoming connections by target name, and node names by their lowercase
+        # form (first name wins) for case-insensitive reference lookups
+        connections_to = defaultdict(list)
+        for conn in self.connections:
+            connections_to[conn.to_node.name].append(conn)
+        lower_names = {}
+        for existing_name in node_dict:
+            lower_names.setdefault(existing_name.lower(), existing_name)
+        # Parse relative positioning from position_str where relative_to wasn't set
+        for data in unresolved:
+            if not data.get('relative_to') and data.get('position_str'):
+                pos_str = data['position_str']
+                # Try to extract relative positioning
+                ref_name = None
+                relative = _relative_position(pos_str)
+                if relative:
+                    direction, ref_name = relative
+                    axis, default_shift = _RELATIVE_DEFAULTS[direction]
+                    shift_key = axis + 'shift'
+                    if data.get(shift_key, 0) == 0:
+                        data[shift_key] = default_shift * 50  # Default in pixels
                 
-                # Try to infer position from connections
-                connections_to_this = [c for c in self.connections if c.to_node.name == data['name']]
-                connections_from_this = [c for c in self.connections if c.from_node.name == data['name']]
+                # Parse shifts from position string
+                xshift_match = _XSHIFT_RE.search(pos_str)
+                yshift_match = _YSHIFT_RE.search(pos_str)
+                if xshift_match:
+                    data['xshift'] = float(xshift_match.group(1)) * 50
+                if yshift_match:
+                    data['yshift'] = -float(yshift_match.group(1)) * 50
                 
+                if ref_name:
+                    data['relative_to'] = ref_name
+                    log.debug("Parsed relative positioning: %s -> %s", data['name'], ref_name)
+        
+        # Place nodes in the order repeated passes over the list would: every node is
+        # tried on the first pass, and one whose reference is missing is woken when a
+        # node of that (lowercased) name is placed, retrying later in the same pass if
+        # it comes after that node in the list and on the next pass otherwise
+        pending = [(0, i) for i in range(len(unresolved))]  # (pass, index) heap, already ordered
+        waiting = defaultdict(list)  # lowercased reference name -> indices waiting on it
+        while pending:
+            pass_no, i = heapq.heappop(pending)
+            data = unresolved[i]
+            if data['name'] in node_dict:
+                continue
+            
+            x = y = None
+            # Try to find reference node by name matching, exact match first
+            ref_name = data['relative_to'].strip() if data.get('relative_to') else None
+            if ref_name:
+                existing_name = ref_name if ref_name in node_dict else lower_names.get(ref_name.lower())
+                if existing_name is not None:
+                    ref_node = node_dict[existing_name]
+                    x = ref_node.x + data.get('xshift', 0)
+                    y = ref_node.y + data.get('yshift', 0)
+                    source = f"relative to {existing_name!r}"
+            
+            # Try to infer position from connections
+            if x is None:
+                connections_to_this = connections_to.get(data['name'])
                 if connections_to_this:
                     # Position relative to source node
                     source_node = connections_to_this[0].from_node
                     x = source_node.x + 150  # Default offset
                     y = source_node.y + 100
-                    # Snap to grid with alignment
-                    x, y = self._snap_autolayout_position(x, y)
-                    node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
-                    node_dict[data['name']] = node
-                    self.nodes.append(node)
-                    print(f"    ✓ Autolayout from connection: {data['name']} -> ({x:.1f}, {y:.1f})")
-                    progress = True
-                    continue
-                
-                still_unresolved.append(data)
+                    source = "from connection"
             
-            unresolved = still_unresolved
-            if not progress or not unresolved:
-                break
+            if x is None:
+                if ref_name:
+                    waiting[ref_name.lower()].append(i)
+                continue
+            
+            # Snap to grid with alignment
+            x, y = self._snap_autolayout_position(x, y)
+            node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
+            node_dict[data['name']] = node
+            lower_names.setdefault(data['name'].lower(), data['name'])
+            self.nodes.append(node)
+            log.debug("Autolayout resolved: %s %s -> (%.1f, %.1f)", data['name'], source, x, y)
+            
+            for j in waiting.pop(data['name'].lower(), ()):
+                next_pass = pass_no if j > i else pass_no + 1
+                if next_pass < max_iterations:
+                    heapq.heappush(pending, (next_pass, j))
+        unresolved = [data for data in unresolved if data['name'] not in node_dict]
         
         # Final fallback: position remaining nodes in a grid
         if unresolved:
-            print(f"    Applying grid layout for {len(unresolved)} remaining nodes...")
+            log.debug("Applying grid layout for %d remaining nodes...", len(unresolved))
             grid_cols = 4
             for i, data in enumerate(unresolved):
                 if data['name'] not in node_dict:
@@ -677,35 +1063,90 @@ class TikZCanvas(QWidget):
                     node = TikZNode(data['name'], x, y, data['text'], data['style_type'])
                     node_dict[data['name']] = node
                     self.nodes.append(node)
-                    print(f"    ✓ Grid layout: {data['name']} -> ({x:.1f}, {y:.1f})")
+                    log.debug("Grid layout: %s -> (%.1f, %.1f)", data['name'], x, y)
+    
+    def _snap_to_grid(self, value):
+        """Snap a pixel coordinate to the nearest grid line in integer arithmetic, ties going to the
+        even multiple as with round()"""
+        # floor(2v) >= (2k - 1) * grid exactly when v / grid >= k - 0.5
+        twice = math.floor(2 * value)
+        k, rem = divmod(twice + self.grid_size, 2 * self.grid_size)
+        if rem == 0 and k % 2 and twice == 2 * value:
+            # Exactly halfway between two grid lines
+            k -= 1
+        return k * self.grid_size
     
     def _snap_autolayout_position(self, x, y):
         """Snap autolayout position to grid with alignment detection"""
         # First snap to grid
-        x = round(x / self.grid_size) * self.grid_size
-        y = round(y / self.grid_size) * self.grid_size
+        x = self._snap_to_grid(x)
+        y = self._snap_to_grid(y)
         
         # Then check for alignment with existing nodes (if snap_to_grid is enabled)
         if self.snap_to_grid:
             # Find alignment candidates
-            candidates = self.find_alignment_candidates(x, y, None)
+            indices = self._alignment_indices(x, y, None)
+            nx, ny, _, _ = self._node_arrays()
             
             # Prioritize horizontal alignment
-            if candidates['horizontal']:
+            if indices['horizontal'].size:
                 # Use the most common Y coordinate
-                y_values = [align_y for _, align_y in candidates['horizontal']]
-                y = round(sum(y_values) / len(y_values) / self.grid_size) * self.grid_size
+                y_values = ny[indices['horizontal']].tolist()
+                y = self._snap_to_grid(sum(y_values) / len(y_values))
             
             # Then vertical alignment
-            if candidates['vertical']:
-                x_values = [align_x for _, align_x in candidates['vertical']]
-                x = round(sum(x_values) / len(x_values) / self.grid_size) * self.grid_size
+            if indices['vertical'].size:
+                x_values = nx[indices['vertical']].tolist()
+                x = self._snap_to_grid(sum(x_values) / len(x_values))
         
         return x, y
     
+    def invalidate_scene(self):
+        """Drop the cached scene and export after nodes, groups or the view change, and repaint"""
+        self._scene_pixmap = None
+        self._export_cache = None
+        self.update()
+    
+    def _schedule_repaint(self):
+        """Drop the cached scene and export, and repaint once the current repaint interval elapses"""
+        self._scene_pixmap = None
+        self._export_cache = None
+        if not self._repaint_timer.isActive():
+            self._repaint_timer.start()
+    
     def paintEvent(self, event):
         """Paint the canvas"""
+        # The static scene is only re-rendered when invalidated or resized
+        dpr = self.devicePixelRatioF()
+        viewport = self._world_viewport()
+        if (self._scene_pixmap is None or self._scene_pixmap.size() != self.size() * dpr):
+            self._render_scene(dpr, viewport)
+        
         painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._scene_pixmap)
+        
+        # Draw alignment guides if snapping and dragging
+        if self.snap_to_grid and self.drag_node:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.translate(self.offset_x, self.offset_y)
+            painter.scale(self.zoom_level, self.zoom_level)
+            self._draw_alignment_guides(painter, viewport)
+    
+    def _world_viewport(self):
+        """Return (inv_zoom, world_left, world_top, world_right, world_bottom) for the visible area"""
+        inv_zoom = 1.0 / self.zoom_level if self.zoom_level > 0 else 1.0
+        return (inv_zoom,
+                -self.offset_x * inv_zoom,
+                -self.offset_y * inv_zoom,
+                (self.width() - self.offset_x) * inv_zoom,
+                (self.height() - self.offset_y) * inv_zoom)
+    
+    def _render_scene(self, dpr, viewport):
+        """Render grid, background groups, connections and nodes into the scene pixmap"""
+        self._scene_pixmap = QPixmap(self.size() * dpr)
+        self._scene_pixmap.setDevicePixelRatio(dpr)
+        self._scene_pixmap.fill(self.palette().color(self.backgroundRole()))
+        painter = QPainter(self._scene_pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
         
         # Save painter state and apply transformation
@@ -713,265 +1154,294 @@ class TikZCanvas(QWidget):
         painter.translate(self.offset_x, self.offset_y)
         painter.scale(self.zoom_level, self.zoom_level)
         
+        # Visible area in world coordinates
+        inv_zoom, world_left, world_top, world_right, world_bottom = viewport
+        # Slack for outlines, selection highlights, handles and arrowheads drawn
+        # outside an item's own bounds
+        pad = 10 * inv_zoom + 2
+        
         # Draw grid (in world coordinates)
         if self.show_grid:
-            # Calculate visible area in world coordinates
-            inv_zoom = 1.0 / self.zoom_level if self.zoom_level > 0 else 1.0
-            world_left = -self.offset_x * inv_zoom
-            world_right = (self.width() - self.offset_x) * inv_zoom
-            world_top = -self.offset_y * inv_zoom
-            world_bottom = (self.height() - self.offset_y) * inv_zoom
-            
             # Draw grid lines
-            pen = QPen(QColor(200, 200, 200), max(0.5, 1.0 * inv_zoom), Qt.DashLine)
-            painter.setPen(pen)
+            painter.setPen(self._pen((200, 200, 200), max(0.5, 1.0 * inv_zoom), Qt.DashLine))
             
             # Horizontal grid lines
             start_y = int(world_top // self.grid_size) * self.grid_size
             end_y = int(world_bottom) + self.grid_size
-            for y in range(start_y, end_y, self.grid_size):
-                painter.drawLine(int(world_left), y, int(world_right), y)
+            left, right = int(world_left), int(world_right)
+            painter.drawLines([QLine(left, y, right, y) for y in range(start_y, end_y, self.grid_size)])
             
             # Vertical grid lines
             start_x = int(world_left // self.grid_size) * self.grid_size
             end_x = int(world_right) + self.grid_size
-            for x in range(start_x, end_x, self.grid_size):
-                painter.drawLine(x, int(world_top), x, int(world_bottom))
-        
-        # Draw background groups first (behind everything)
+            top, bottom = int(world_top), int(world_bottom)
+            painter.drawLines([QLine(x, top, x, bottom) for x in range(start_x, end_x, self.grid_size)])
+        
+        # Draw background groups first (behind everything); outline and selection
+        # sizes depend only on the zoom, so they are worked out once per frame
+        group_pen_width = max(1, 2 * inv_zoom)
+        corner_radius = max(2, 5 * inv_zoom)
+        highlight_pen = self._pen((255, 0, 0), max(1, 3 * inv_zoom))
+        adjust = int(max(1, 2 * inv_zoom))
+        handle_size = max(4, 6 * inv_zoom)
         for bg_group in self.background_groups:
+            # Skip groups entirely outside the viewport
+            if (bg_group.x + bg_group.half_width + pad < world_left or
+                    bg_group.x - bg_group.half_width - pad > world_right or
+                    bg_group.y + bg_group.half_height + pad < world_top or
+                    bg_group.y - bg_group.half_height - pad > world_bottom):
+                continue
             group_rect = bg_group.get_rect()
             
-            # Parse style for fill and draw colors
-            fill_color = QColor(173, 216, 230, 50)  # Default light blue with transparency
-            draw_color = QColor(100, 150, 200, 150)  # Default blue border
-            is_dashed = False
-            
-            # Extract fill color
-            fill_match = re.search(r'fill=([^,}]+)', bg_group.style_str)
-            if fill_match:
-                fill_str = fill_match.group(1).strip()
-                # Handle color!opacity format
-                if '!' in fill_str:
-                    color_name, opacity = fill_str.split('!')
-                    opacity_val = int(opacity) if opacity.isdigit() else 20
-                    if 'blue' in color_name.lower():
-                        fill_color = QColor(173, 216, 230, int(255 * opacity_val / 100))
-                    elif 'green' in color_name.lower():
-                        fill_color = QColor(144, 238, 144, int(255 * opacity_val / 100))
-                    else:
-                        fill_color = QColor(200, 200, 200, int(255 * opacity_val / 100))
-            
-            # Extract draw color
-            draw_match = re.search(r'draw=([^,}]+)', bg_group.style_str)
-            if draw_match:
-                draw_str = draw_match.group(1).strip()
-                if 'blue' in draw_str.lower():
-                    draw_color = QColor(100, 150, 200, 200)
-                elif 'green' in draw_str.lower():
-                    draw_color = QColor(50, 150, 50, 200)
-            
-            # Check for dashed
-            if 'dashed' in bg_group.style_str:
-                is_dashed = True
+            fill_color, draw_color, is_dashed, rounded = bg_group.cached_style()
             
             # Draw filled rectangle
-            brush = QBrush(fill_color)
-            pen = QPen(draw_color, max(1, 2 * inv_zoom))
-            if is_dashed:
-                pen.setStyle(Qt.DashLine)
-            painter.setBrush(brush)
-            painter.setPen(pen)
+            painter.setBrush(QBrush(fill_color))
+            painter.setPen(self._pen(draw_color.getRgb(), group_pen_width,
+                                     Qt.DashLine if is_dashed else Qt.SolidLine))
             
             # Draw rounded rectangle if specified
-            if 'rounded corners' in bg_group.style_str:
-                corner_radius = max(2, 5 * inv_zoom)
+            if rounded:
                 painter.drawRoundedRect(group_rect, corner_radius, corner_radius)
             else:
                 painter.drawRect(group_rect)
             
             # Draw selection highlight and resize handles
             if bg_group.selected:
-                highlight_pen = QPen(QColor(255, 0, 0), max(1, 3 * inv_zoom))
                 painter.setPen(highlight_pen)
-                painter.setBrush(QBrush())
-                adjust = int(max(1, 2 * inv_zoom))
+                painter.setBrush(self._no_brush)
                 painter.drawRect(group_rect.adjusted(-adjust, -adjust, adjust, adjust))
                 
                 # Draw resize handles
-                handle_size = max(4, 6 * inv_zoom)
-                handles = [
-                    (group_rect.left(), group_rect.top()),  # NW
-                    (group_rect.right(), group_rect.top()),  # NE
-                    (group_rect.left(), group_rect.bottom()),  # SW
-                    (group_rect.right(), group_rect.bottom()),  # SE
-                ]
-                painter.setBrush(QBrush(QColor(255, 0, 0)))
-                for hx, hy in handles:
-                    painter.drawRect(int(hx - handle_size/2), int(hy - handle_size/2),
-                                    int(handle_size), int(handle_size))
+                painter.setBrush(self._handle_brush)
+                painter.drawRects(bg_group.get_handle_rects(group_rect, handle_size))
         
         # Draw connections (behind nodes)
+        # Segments are collected per line style and drawn in one call each
+        solid_lines = []
+        dashed_lines = []
+        arrow_size = max(5, 10 * inv_zoom)
         for conn in self.connections:
-            from_rect = conn.from_node.get_rect()
-            to_rect = conn.to_node.get_rect()
+            # Skip connections whose endpoint box is outside the viewport
+            from_node, to_node = conn.from_node, conn.to_node
+            if (max(from_node.x, to_node.x) + pad < world_left or
+                    min(from_node.x, to_node.x) - pad > world_right or
+                    max(from_node.y, to_node.y) + pad < world_top or
+                    min(from_node.y, to_node.y) - pad > world_bottom):
+                continue
+            from_rect = from_node.get_rect()
+            to_rect = to_node.get_rect()
             
             from_center = from_rect.center()
             to_center = to_rect.center()
             
-            inv_zoom = 1.0 / self.zoom_level if self.zoom_level > 0 else 1.0
-            pen = QPen(QColor(100, 100, 100), max(1, 2 * inv_zoom))
-            if conn.style == "dashed":
-                pen.setStyle(Qt.DashLine)
-            painter.setPen(pen)
+            lines = dashed_lines if conn.style == "dashed" else solid_lines
             
-            # Draw arrow
-            painter.drawLine(from_center, to_center)
+            # Arrow shaft
+            lines.append(QLine(from_center, to_center))
             # Simple arrowhead (scale with zoom)
-            angle = math.atan2(float(to_center.y() - from_center.y()), 
-                             float(to_center.x() - from_center.x()))
-            arrow_size = max(5, 10 * inv_zoom)
-            arrow_x1 = int(to_center.x() - arrow_size * math.cos(angle - 0.5))
-            arrow_y1 = int(to_center.y() - arrow_size * math.sin(angle - 0.5))
-            arrow_x2 = int(to_center.x() - arrow_size * math.cos(angle + 0.5))
-            arrow_y2 = int(to_center.y() - arrow_size * math.sin(angle + 0.5))
-            painter.drawLine(to_center, QPoint(arrow_x1, arrow_y1))
-            painter.drawLine(to_center, QPoint(arrow_x2, arrow_y2))
-        
-        # Draw nodes
+            to_x, to_y = to_center.x(), to_center.y()
+            dx = to_x - from_center.x()
+            dy = to_y - from_center.y()
+            length = math.hypot(dx, dy)
+            ux, uy = (dx / length, dy / length) if length else (1.0, 0.0)
+            # Rotate the unit direction by -0.5 and +0.5 rad
+            rx1, ry1 = ux * _ARROW_COS + uy * _ARROW_SIN, uy * _ARROW_COS - ux * _ARROW_SIN
+            rx2, ry2 = ux * _ARROW_COS - uy * _ARROW_SIN, uy * _ARROW_COS + ux * _ARROW_SIN
+            arrow_x1 = int(to_x - arrow_size * rx1)
+            arrow_y1 = int(to_y - arrow_size * ry1)
+            arrow_x2 = int(to_x - arrow_size * rx2)
+            arrow_y2 = int(to_y - arrow_size * ry2)
+            lines.append(QLine(to_x, to_y, arrow_x1, arrow_y1))
+            lines.append(QLine(to_x, to_y, arrow_x2, arrow_y2))
+        if solid_lines:
+            painter.setPen(self._pen((100, 100, 100), max(1, 2 * inv_zoom)))
+            painter.drawLines(solid_lines)
+        if dashed_lines:
+            painter.setPen(self._pen((100, 100, 100), max(1, 2 * inv_zoom), Qt.DashLine))
+            painter.drawLines(dashed_lines)
+        
+        # Draw nodes from cached pixmaps, blitted in device coordinates
+        transform = painter.worldTransform()
+        painter.save()
+        painter.resetTransform()
         for node in self.nodes:
+            # Skip nodes outside the viewport; text may overflow the node's width
+            half_extent_x = max(node.half_width, node.text_width / 2) + pad
+            if (node.x + half_extent_x < world_left or node.x - half_extent_x > world_right or
+                    node.y + node.half_height + pad < world_top or
+                    node.y - node.half_height - pad > world_bottom):
+                continue
             rect = node.get_rect()
-            
-            # Select color based on style
-            if node.style_type == "ellipse":
-                color = QColor(173, 216, 230)  # Light blue
-            elif node.style_type == "cylinder":
-                color = QColor(221, 160, 221)  # Plum
-            elif node.style_type == "dashed_rect":
-                color = QColor(144, 238, 144)  # Light green
-            elif node.style_type == "yellow_rect":
-                color = QColor(255, 255, 200)  # Light yellow
-            else:
-                color = QColor(255, 218, 185)  # Peach
-            
-            # Draw node shape
-            brush = QBrush(color)
-            inv_zoom = 1.0 / self.zoom_level if self.zoom_level > 0 else 1.0
-            pen = QPen(QColor(0, 0, 0), max(1, 2 * inv_zoom))
-            if node.style_type == "dashed_rect":
-                pen.setStyle(Qt.DashLine)
-            
-            painter.setBrush(brush)
-            painter.setPen(pen)
-            
-            if node.style_type == "ellipse":
-                painter.drawEllipse(rect)
-            elif node.style_type == "cylinder":
-                # Draw cylinder shape
-                painter.drawEllipse(rect.x(), rect.y(), rect.width(), rect.height() // 3)
-                painter.drawRect(rect.x(), rect.y() + rect.height() // 6, 
-                               rect.width(), rect.height() * 2 // 3)
-            else:
-                corner_radius = max(2, 5 * inv_zoom)
-                painter.drawRoundedRect(rect, corner_radius, corner_radius)
-            
-            # Draw text (scale font size with zoom - keep readable)
-            painter.setPen(QPen(QColor(0, 0, 0)))
-            # Font size should scale with zoom but have reasonable min/max
-            base_font_size = 9
-            font_size = max(6, min(24, int(base_font_size * self.zoom_level)))
-            font = QFont("Arial", font_size)
-            painter.setFont(font)
-            
-            # Handle multi-line text (split by \n)
-            # Clean text one more time in case any LaTeX commands slipped through
-            clean_text = node.text
-            # Remove any remaining LaTeX commands
-            clean_text = re.sub(r'\\textbf\{([^}]+)\}', r'\1', clean_text)
-            clean_text = re.sub(r'\\[a-zA-Z]+\{([^}]*)\}', r'\1', clean_text)
-            clean_text = re.sub(r'\\[a-zA-Z]+\s*', '', clean_text)
-            clean_text = clean_text.replace('\\', '')
-            
-            text_lines = [line.strip() for line in clean_text.split('\n') if line.strip()]
-            
-            if text_lines:
-                # Calculate text height
-                line_height = 14
-                total_height = len(text_lines) * line_height
-                start_y = rect.y() + (rect.height() - total_height) / 2 + line_height
-                
-                for i, line in enumerate(text_lines):
-                    # Make first line bold if it looks like a title (and has multiple lines)
-                    if i == 0 and len(text_lines) > 1:
-                        bold_font = QFont(font)
-                        bold_font.setBold(True)
-                        bold_font.setPointSize(10)
-                        painter.setFont(bold_font)
-                    else:
-                        small_font = QFont(font)
-                        small_font.setPointSize(8)
-                        painter.setFont(small_font)
-                    
-                    painter.drawText(rect.x(), int(start_y + i * line_height), 
-                                   rect.width(), line_height,
-                                   Qt.AlignCenter | Qt.AlignVCenter, line)
-            
-            # Draw selection highlight
-            if node.selected:
-                inv_zoom = 1.0 / self.zoom_level if self.zoom_level > 0 else 1.0
-                highlight_width = max(1, 3 * inv_zoom)
-                painter.setPen(QPen(QColor(255, 0, 0), highlight_width))
-                painter.setBrush(QBrush())
-                adjust = int(max(1, 2 * inv_zoom))
-                painter.drawRect(rect.adjusted(-adjust, -adjust, adjust, adjust))
-        
-        # Draw alignment guides if snapping and dragging
-        if self.snap_to_grid and self.drag_node:
-            guide_pen = QPen(QColor(0, 150, 255), max(1, 2 / self.zoom_level), Qt.DashLine)
-            painter.setPen(guide_pen)
-            
-            candidates = self.find_alignment_candidates(self.drag_node.x, self.drag_node.y, self.drag_node)
-            
-            # Calculate visible area in world coordinates
-            inv_zoom = 1.0 / self.zoom_level if self.zoom_level > 0 else 1.0
-            world_left = -self.offset_x * inv_zoom
-            world_right = (self.width() - self.offset_x) * inv_zoom
-            world_top = -self.offset_y * inv_zoom
-            world_bottom = (self.height() - self.offset_y) * inv_zoom
-            
-            # Draw horizontal guides
-            for node, align_y in candidates['horizontal']:
-                painter.drawLine(int(world_left), int(align_y), int(world_right), int(align_y))
-            
-            # Draw vertical guides
-            for node, align_x in candidates['vertical']:
-                painter.drawLine(int(align_x), int(world_top), int(align_x), int(world_bottom))
-            
-            # Draw diagonal guides (45 and 135 degrees) - simplified for now
-            for node, align_x, align_y in candidates['diagonal_45']:
-                # 45-degree line: y = x + c, where c = align_y - align_x
-                c = align_y - align_x
-                # Draw line segment within visible area
-                x1 = max(world_left, world_top - c)
-                y1 = x1 + c
-                x2 = min(world_right, world_bottom - c)
-                y2 = x2 + c
-                if x1 < x2 and y1 >= world_top and y2 <= world_bottom:
-                    painter.drawLine(int(x1), int(y1), int(x2), int(y2))
-            
-            for node, align_x, align_y in candidates['diagonal_135']:
-                # 135-degree line: y = -x + c, where c = align_y + align_x
-                c = align_y + align_x
-                # Draw line segment within visible area
-                x1 = max(world_left, c - world_bottom)
-                y1 = -x1 + c
-                x2 = min(world_right, c - world_top)
-                y2 = -x2 + c
-                if x1 < x2 and y1 >= world_top and y2 <= world_bottom:
-                    painter.drawLine(int(x1), int(y1), int(x2), int(y2))
+            pixmap, margin_x, margin_y = self._node_pixmap(node, dpr)
+            top_left = transform.map(QPointF(rect.x() - margin_x, rect.y() - margin_y))
+            # Land on whole device pixels so the pixmap is copied rather than resampled
+            painter.drawPixmap(QPointF(round(top_left.x() * dpr) / dpr, round(top_left.y() * dpr) / dpr), pixmap)
+        painter.restore()
         
         # Restore painter state
         painter.restore()
+        painter.end()
+    
+    def _draw_alignment_guides(self, painter, viewport):
+        """Draw alignment guides for the node being dragged (in world coordinates)"""
+        inv_zoom, world_left, world_top, world_right, world_bottom = viewport
+        painter.setPen(self._pen((0, 150, 255), max(1, 2 * inv_zoom), Qt.DashLine))
+        
+        indices = self._alignment_indices(self.drag_node.x, self.drag_node.y, self.drag_node)
+        nx, ny, _, _ = self._node_arrays()
+        
+        # Horizontal and vertical guides span the visible area
+        left, right = int(world_left), int(world_right)
+        top, bottom = int(world_top), int(world_bottom)
+        lines = [QLine(left, align_y, right, align_y) for align_y in ny[indices['horizontal']].astype(int).tolist()]
+        lines += [QLine(align_x, top, align_x, bottom) for align_x in nx[indices['vertical']].astype(int).tolist()]
+        
+        # Diagonal guides (45 and 135 degrees), clipped to the visible area for all
+        # candidates at once
+        diagonal_45 = indices['diagonal_45']
+        if diagonal_45.size:
+            # 45-degree line: y = x + c, where c = align_y - align_x
+            c = ny[diagonal_45] - nx[diagonal_45]
+            x1 = np.maximum(world_left, world_top - c)
+            x2 = np.minimum(world_right, world_bottom - c)
+            lines += self._guide_segments(x1, x1 + c, x2, x2 + c, world_top, world_bottom)
+        
+        diagonal_135 = indices['diagonal_135']
+        if diagonal_135.size:
+            # 135-degree line: y = -x + c, where c = align_y + align_x
+            c = ny[diagonal_135] + nx[diagonal_135]
+            x1 = np.maximum(world_left, c - world_bottom)
+            x2 = np.minimum(world_right, c - world_top)
+            lines += self._guide_segments(x1, c - x1, x2, c - x2, world_top, world_bottom)
+        
+        if lines:
+            painter.drawLines(lines)
+    
+    @staticmethod
+    def _guide_segments(x1, y1, x2, y2, world_top, world_bottom):
+        """Integer guide lines for the clipped segments that are still visible"""
+        visible = (x1 < x2) & (y1 >= world_top) & (y2 <= world_bottom)
+        coords = np.stack((x1, y1, x2, y2), axis=1)[visible].astype(int)
+        return [QLine(*row) for row in coords.tolist()]
+    
+    def _node_pixmap(self, node, dpr):
+        """Return (pixmap, margin_x, margin_y) for a node rendered at the current zoom and dpr"""
+        zoom = self.zoom_level if self.zoom_level > 0 else 1.0
+        if self._node_pixmap_scale != (zoom, dpr):
+            # Pixmaps for another zoom level would only crowd out the ones in use
+            for key in self._node_pixmap_keys:
+                QPixmapCache.remove(key)
+            self._node_pixmap_keys.clear()
+            self._node_pixmap_scale = (zoom, dpr)
+        width, height = int(node.width), int(node.height)
+        key = f"tikznode:{node.style_type}:{width}x{height}:{zoom:.6f}:{dpr:g}:{int(node.selected)}:{node.text}"
+        inv_zoom = 1.0 / zoom
+        # Room for the outline and selection highlight, plus any text wider than the node
+        margin_y = int(max(1, 2 * inv_zoom)) + int(max(1, 3 * inv_zoom)) + 2
+        margin_x = max(margin_y, (node.text_width - width) // 2 + 1)
+        pixmap = QPixmapCache.find(key)
+        if pixmap is None:
+            pixmap = QPixmap(math.ceil((width + 2 * margin_x) * zoom * dpr),
+                             math.ceil((height + 2 * margin_y) * zoom * dpr))
+            pixmap.setDevicePixelRatio(dpr)
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.scale(zoom, zoom)
+            self._draw_node(painter, node, QRect(margin_x, margin_y, width, height), inv_zoom)
+            painter.end()
+            QPixmapCache.insert(key, pixmap)
+            self._node_pixmap_keys.add(key)
+        return pixmap, margin_x, margin_y
+    
+    def _pen(self, rgba, width, style=Qt.SolidLine):
+        """Return a shared pen for an (r, g, b[, a]) colour, width and line style"""
+        key = (rgba, width, style)
+        pen = self._pen_cache.get(key)
+        if pen is None:
+            if len(self._pen_cache) >= PEN_CACHE_SIZE:
+                self._pen_cache.popitem(last=False)
+            pen = self._pen_cache[key] = QPen(QColor(*rgba), width, style)
+        else:
+            self._pen_cache.move_to_end(key)
+        return pen
+    
+    def _font(self, point_size, bold=False):
+        """Return a shared Arial font of the given point size"""
+        key = (point_size, bold)
+        font = self._font_cache.get(key)
+        if font is None:
+            font = self._font_cache[key] = QFont("Arial", point_size)
+            font.setBold(bold)
+        return font
+    
+    def _draw_node(self, painter, node, rect, inv_zoom):
+        """Draw a node's shape, text and selection highlight into rect"""
+        # Draw node shape, filled by style
+        painter.setBrush(self._brush_by_style.get(node.style_type, self._default_brush))
+        painter.setPen(self._pen((0, 0, 0), max(1, 2 * inv_zoom),
+                                 Qt.DashLine if node.style_type == "dashed_rect" else Qt.SolidLine))
+        
+        if node.style_type == "ellipse":
+            painter.drawEllipse(rect)
+        elif node.style_type == "cylinder":
+            # Draw cylinder shape
+            painter.drawEllipse(rect.x(), rect.y(), rect.width(), rect.height() // 3)
+            painter.drawRect(rect.x(), rect.y() + rect.height() // 6, 
+                           rect.width(), rect.height() * 2 // 3)
+        else:
+            corner_radius = max(2, 5 * inv_zoom)
+            painter.drawRoundedRect(rect, corner_radius, corner_radius)
+        
+        # Draw text (scale font size with zoom - keep readable)
+        painter.setPen(self._pen((0, 0, 0), 1))
+        # Font size should scale with zoom but have reasonable min/max
+        base_font_size = 9
+        font_size = max(6, min(24, int(base_font_size * self.zoom_level)))
+        painter.setFont(self._font(font_size))
+        
+        # Handle multi-line text (split by \n)
+        text_lines = node.get_static_text()
+        
+        if text_lines:
+            # Calculate text height
+            line_height = 14
+            total_height = len(text_lines) * line_height
+            start_y = rect.y() + (rect.height() - total_height) / 2 + line_height
+            
+            for i, static_text in enumerate(text_lines):
+                # Make first line bold if it looks like a title (and has multiple lines)
+                if i == 0 and len(text_lines) > 1:
+                    line_font = self._font(10, bold=True)
+                else:
+                    line_font = self._font(8)
+                painter.setFont(line_font)
+                
+                # Lay the line out in its own font before measuring it, then centre it in its
+                # line_height slot; drawStaticText reuses the layout
+                static_text.prepare(painter.transform(), line_font)
+                size = static_text.size()
+                painter.drawStaticText(QPointF(rect.x() + (rect.width() - size.width()) / 2,
+                                               int(start_y + i * line_height) + (line_height - size.height()) / 2),
+                                       static_text)
+        
+        # Draw selection highlight
+        if node.selected:
+            highlight_width = max(1, 3 * inv_zoom)
+            painter.setPen(self._pen((255, 0, 0), highlight_width))
+            painter.setBrush(self._no_brush)
+            adjust = int(max(1, 2 * inv_zoom))
+            painter.drawRect(rect.adjusted(-adjust, -adjust, adjust, adjust))
+    
+    def _clear_selection(self):
+        """Deselect the nodes and groups selected through the canvas"""
+        for node in self._selected_nodes:
+            node.selected = False
+        for bg_group in self._selected_groups:
+            bg_group.selected = False
+        self._selected_nodes.clear()
+        self._selected_groups.clear()
     
     def mousePressEvent(self, event):
         """Handle mouse press"""
@@ -993,15 +1463,13 @@ class TikZCanvas(QWidget):
             
             if clicked_group and resize_handle:
                 # Deselect all
-                for node in self.nodes:
-                    node.selected = False
-                for bg in self.background_groups:
-                    bg.selected = False
+                self._clear_selection()
                 clicked_group.selected = True
+                self._selected_groups.add(clicked_group)
                 self.drag_group = clicked_group
                 self.drag_offset_x = world_x - clicked_group.x
                 self.drag_offset_y = world_y - clicked_group.y
-                self.update()
+                self.invalidate_scene()
                 return
             
             # Check for background group click (but not on resize handle)
@@ -1013,33 +1481,28 @@ class TikZCanvas(QWidget):
             
             if clicked_group:
                 # Deselect all
-                for node in self.nodes:
-                    node.selected = False
-                for bg in self.background_groups:
-                    bg.selected = False
+                self._clear_selection()
                 clicked_group.selected = True
+                self._selected_groups.add(clicked_group)
                 self.drag_group = clicked_group
                 self.drag_offset_x = world_x - clicked_group.x
                 self.drag_offset_y = world_y - clicked_group.y
-                self.update()
+                self.invalidate_scene()
                 return
             
             # Find clicked node
-            clicked_node = None
-            for node in reversed(self.nodes):  # Check from top to bottom
-                if node.contains_point(world_x, world_y):
-                    clicked_node = node
-                    break
+            clicked_node = self._node_at(world_x, world_y)
             
             if clicked_node:
                 # Deselect all
-                for node in self.nodes:
-                    node.selected = False
-                for bg in self.background_groups:
-                    bg.selected = False
+                self._clear_selection()
                 clicked_node.selected = True
+                self._selected_nodes.add(clicked_node)
                 self.selected_node = clicked_node
                 self.drag_node = clicked_node
+                # Group bounds are tracked incrementally while this node is dragged
+                for bg_group in self._groups_for_node(clicked_node.name):
+                    bg_group._bounds_cache = None
                 
                 # Calculate drag offset in world coordinates (store as float for precision)
                 self.drag_offset_x = world_x - clicked_node.x
@@ -1047,13 +1510,10 @@ class TikZCanvas(QWidget):
                 self.node_selected.emit(clicked_node.name)
             else:
                 # Deselect all
-                for node in self.nodes:
-                    node.selected = False
-                for bg in self.background_groups:
-                    bg.selected = False
+                self._clear_selection()
                 self.selected_node = None
             
-            self.update()
+            self.invalidate_scene()
         elif event.button() == self.pan_button:
             # Start panning
             self.pan_active = True
@@ -1068,7 +1528,7 @@ class TikZCanvas(QWidget):
             self.offset_x += delta.x()
             self.offset_y += delta.y()
             self.pan_start = event.pos()
-            self.update()
+            self._schedule_repaint()
         elif self.drag_group and event.buttons() & Qt.LeftButton:
             # Convert screen coordinates to world coordinates
             world_x, world_y = self.screen_to_world(event.x(), event.y())
@@ -1076,35 +1536,35 @@ class TikZCanvas(QWidget):
             if self.drag_group.is_resizing:
                 # Resize the group
                 handle = self.drag_group.resize_handle
-                group_left = self.drag_group.x - self.drag_group.width/2
-                group_right = self.drag_group.x + self.drag_group.width/2
-                group_top = self.drag_group.y - self.drag_group.height/2
-                group_bottom = self.drag_group.y + self.drag_group.height/2
+                group_left = self.drag_group.x - self.drag_group.half_width
+                group_right = self.drag_group.x + self.drag_group.half_width
+                group_top = self.drag_group.y - self.drag_group.half_height
+                group_bottom = self.drag_group.y + self.drag_group.half_height
                 
                 if 'n' in handle:  # North (top)
                     new_top = world_y
                     new_height = group_bottom - new_top
                     if new_height >= 20:
                         self.drag_group.height = new_height
-                        self.drag_group.y = new_top + self.drag_group.height/2
+                        self.drag_group.y = new_top + self.drag_group.half_height
                 if 's' in handle:  # South (bottom)
                     new_bottom = world_y
                     new_height = new_bottom - group_top
                     if new_height >= 20:
                         self.drag_group.height = new_height
-                        self.drag_group.y = group_top + self.drag_group.height/2
+                        self.drag_group.y = group_top + self.drag_group.half_height
                 if 'w' in handle:  # West (left)
                     new_left = world_x
                     new_width = group_right - new_left
                     if new_width >= 20:
                         self.drag_group.width = new_width
-                        self.drag_group.x = new_left + self.drag_group.width/2
+                        self.drag_group.x = new_left + self.drag_group.half_width
                 if 'e' in handle:  # East (right)
                     new_right = world_x
                     new_width = new_right - group_left
                     if new_width >= 20:
                         self.drag_group.width = new_width
-                        self.drag_group.x = group_left + self.drag_group.width/2
+                        self.drag_group.x = group_left + self.drag_group.half_width
                 
                 # Apply strict alignment if enabled
                 if self.snap_to_grid:
@@ -1114,9 +1574,6 @@ class TikZCanvas(QWidget):
                     # Snap dimensions to grid
                     self.drag_group.width = round(self.drag_group.width / self.grid_size) * self.grid_size
                     self.drag_group.height = round(self.drag_group.height / self.grid_size) * self.grid_size
-                    
-                    # Update fit_nodes after resize
-                    self._update_group_fit_nodes(self.drag_group)
             else:
                 # Move the group
                 new_x = world_x - self.drag_offset_x
@@ -1128,12 +1585,11 @@ class TikZCanvas(QWidget):
                 
                 self.drag_group.x = new_x
                 self.drag_group.y = new_y
-                
-                # Update fit_nodes list based on which nodes are now within bounds
-                self._update_group_fit_nodes(self.drag_group)
             
+            self._shown_code = None
+            self.has_unexported_edits = True
             self.position_changed.emit()
-            self.update()
+            self._schedule_repaint()
         elif self.drag_node and event.buttons() & Qt.LeftButton:
             # Convert screen coordinates to world coordinates
             world_x, world_y = self.screen_to_world(event.x(), event.y())
@@ -1147,14 +1603,17 @@ class TikZCanvas(QWidget):
             if self.snap_to_grid:
                 new_x, new_y = self.apply_strict_alignment(new_x, new_y)
             
+            old_x, old_y = self.drag_node.x, self.drag_node.y
             self.drag_node.x = new_x
             self.drag_node.y = new_y
+            self._node_moved(self.drag_node)
             
             # Update background groups that contain this node
-            self._update_background_groups_for_node(self.drag_node)
+            self._update_background_groups_for_node(self.drag_node, old_x, old_y)
             
+            self.has_unexported_edits = True
             self.position_changed.emit()
-            self.update()
+            self._schedule_repaint()
     
     def mouseReleaseEvent(self, event):
         """Handle mouse release"""
@@ -1163,40 +1622,87 @@ class TikZCanvas(QWidget):
             self.setCursor(Qt.ArrowCursor)
         self.drag_node = None
         if self.drag_group:
-            was_resizing = self.drag_group.is_resizing
             self.drag_group.is_resizing = False
             self.drag_group.resize_handle = None
-            # Update fit_nodes when resizing or dragging is done
-            if was_resizing:
-                self._update_group_fit_nodes(self.drag_group)
+            # Update fit_nodes once resizing or dragging is done rather than on every move
+            self._update_group_fit_nodes(self.drag_group)
         self.drag_group = None
         self.drag_offset_x = 0.0
         self.drag_offset_y = 0.0
+        # Repaint to clear the alignment guide overlay; the cached scene is unchanged
+        self.update()
     
-    def _update_background_groups_for_node(self, node):
-        """Update background groups when a node moves - recalculate bounds if node is in fit_nodes"""
-        for bg_group in self.background_groups:
-            if node.name in bg_group.fit_nodes:
-                # Node is part of this group - recalculate bounding box
-                referenced_nodes = [n for n in self.nodes if n.name in bg_group.fit_nodes]
-                if referenced_nodes:
-                    min_x = min(n.x - n.width/2 for n in referenced_nodes)
-                    max_x = max(n.x + n.width/2 for n in referenced_nodes)
-                    min_y = min(n.y - n.height/2 for n in referenced_nodes)
-                    max_y = max(n.y + n.height/2 for n in referenced_nodes)
-                    
-                    padding = bg_group.inner_sep * 50
-                    bg_group.width = (max_x - min_x) + 2 * padding
-                    bg_group.height = (max_y - min_y) + 2 * padding
-                    bg_group.x = (min_x + max_x) / 2
-                    bg_group.y = (min_y + max_y) / 2
+    def _groups_for_node(self, name):
+        """Return the background groups listing name in fit_nodes, from a lazily built reverse index"""
+        if self._group_index is None or self._group_index_groups is not self.background_groups:
+            index = defaultdict(list)
+            for bg_group in self.background_groups:
+                for fit_name in set(bg_group.fit_nodes):
+                    index[fit_name].append(bg_group)
+            self._group_index = index
+            self._group_index_groups = self.background_groups
+        return self._group_index.get(name, ())
+    
+    def _group_member_bounds(self, bg_group):
+        """Return (min_x, max_x, min_y, max_y) over the group's fit nodes, or None if none exist"""
+        nx, ny, nw, nh = self._node_arrays()
+        idxs = np.flatnonzero(np.isin(self._nnames, bg_group.fit_nodes))
+        if not idxs.size:
+            return None
+        half_w = nw[idxs] * 0.5
+        half_h = nh[idxs] * 0.5
+        return (float((nx[idxs] - half_w).min()), float((nx[idxs] + half_w).max()),
+                float((ny[idxs] - half_h).min()), float((ny[idxs] + half_h).max()))
+    
+    def _update_background_groups_for_node(self, node, old_x, old_y):
+        """Update background groups when a node moves from (old_x, old_y) - refit groups listing it"""
+        old_left, old_right = old_x - node.half_width, old_x + node.half_width
+        old_top, old_bottom = old_y - node.half_height, old_y + node.half_height
+        left, right = node.x - node.half_width, node.x + node.half_width
+        top, bottom = node.y - node.half_height, node.y + node.half_height
+        for bg_group in self._groups_for_node(node.name):
+            bounds = bg_group._bounds_cache
+            if bounds is not None:
+                min_x, max_x, min_y, max_y = bounds
+                # Extending an edge is a compare; only a node leaving an extreme it
+                # defined needs the members rescanned
+                if ((left > min_x and old_left <= min_x) or (right < max_x and old_right >= max_x) or
+                        (top > min_y and old_top <= min_y) or (bottom < max_y and old_bottom >= max_y)):
+                    bounds = None
+                else:
+                    bounds = (min(min_x, left), max(max_x, right), min(min_y, top), max(max_y, bottom))
+            if bounds is None:
+                bounds = self._group_member_bounds(bg_group)
+                if bounds is None:
+                    continue
+            bg_group._bounds_cache = bounds
+            min_x, max_x, min_y, max_y = bounds
+            
+            padding = bg_group.inner_sep * 50
+            bg_group.width = (max_x - min_x) + 2 * padding
+            bg_group.height = (max_y - min_y) + 2 * padding
+            bg_group.x = (min_x + max_x) / 2
+            bg_group.y = (min_y + max_y) / 2
     
     def _update_group_fit_nodes(self, bg_group):
         """Update which nodes are within the background group's bounds"""
         group_rect = bg_group.get_rect()
         updated_fit_nodes = []
         
-        for node in self.nodes:
+        # Only nodes filed in pick cells around the group can have their centre inside
+        # it; the extra cell covers integer rounding of node rects at cell borders
+        grid = self._node_grid()
+        left = group_rect.left() // PICK_CELL_SIZE - 1
+        right = group_rect.right() // PICK_CELL_SIZE + 1
+        top = group_rect.top() // PICK_CELL_SIZE - 1
+        bottom = group_rect.bottom() // PICK_CELL_SIZE + 1
+        nearby = set()
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                nearby.update(grid.get((cx, cy), ()))
+        
+        for i in sorted(nearby):
+            node = self.nodes[i]
             node_rect = node.get_rect()
             # Check if node center is within group bounds (with some tolerance)
             node_center = node_rect.center()
@@ -1205,8 +1711,10 @@ class TikZCanvas(QWidget):
         
         # Update fit_nodes if changed
         if set(updated_fit_nodes) != set(bg_group.fit_nodes):
-            print(f"  Updated fit_nodes for {bg_group.name}: {bg_group.fit_nodes} -> {updated_fit_nodes}")
+            log.debug("Updated fit_nodes for %s: %s -> %s", bg_group.name, bg_group.fit_nodes, updated_fit_nodes)
             bg_group.fit_nodes = updated_fit_nodes
+            self._group_index = None
+            self._shown_code = None
     
     def wheelEvent(self, event):
         """Handle mouse wheel for zooming"""
@@ -1238,7 +1746,7 @@ class TikZCanvas(QWidget):
             if hasattr(self, 'zoom_changed'):
                 self.zoom_changed.emit()
             
-            self.update()
+            self.invalidate_scene()
     
     def screen_to_world(self, screen_x, screen_y):
         """Convert screen coordinates to world coordinates"""
@@ -1254,109 +1762,259 @@ class TikZCanvas(QWidget):
     
     def find_alignment_candidates(self, node_x, node_y, exclude_node=None):
         """Find nodes that align horizontally, vertically, or diagonally with the given position"""
-        candidates = {
-            'horizontal': [],  # Same Y coordinate
-            'vertical': [],    # Same X coordinate
-            'diagonal_45': [],  # 45 degree diagonal
-            'diagonal_135': []  # 135 degree diagonal
+        indices = self._alignment_indices(node_x, node_y, exclude_node)
+        nodes = self.nodes
+        return {
+            'horizontal': [(nodes[i], nodes[i].y) for i in indices['horizontal']],  # Same Y coordinate
+            'vertical': [(nodes[i], nodes[i].x) for i in indices['vertical']],  # Same X coordinate
+            'diagonal_45': [(nodes[i], nodes[i].x, nodes[i].y) for i in indices['diagonal_45']],
+            'diagonal_135': [(nodes[i], nodes[i].x, nodes[i].y) for i in indices['diagonal_135']],
         }
-        
-        for node in self.nodes:
-            if exclude_node and node == exclude_node:
-                continue
-            
-            # Horizontal alignment (same Y)
-            if abs(node.y - node_y) < self.snap_threshold:
-                candidates['horizontal'].append((node, node.y))
-            
-            # Vertical alignment (same X)
-            if abs(node.x - node_x) < self.snap_threshold:
-                candidates['vertical'].append((node, node.x))
-            
-            # Diagonal alignment (45 degrees: y = x + c)
-            # Check if node is on a 45-degree line through (node_x, node_y)
-            # Line: y - node_y = (x - node_x) * 1
-            expected_y_45 = node_y + (node.x - node_x)
-            if abs(node.y - expected_y_45) < self.snap_threshold:
-                candidates['diagonal_45'].append((node, node.x, node.y))
-            
-            # Diagonal alignment (135 degrees: y = -x + c)
-            # Line: y - node_y = -(x - node_x)
-            expected_y_135 = node_y - (node.x - node_x)
-            if abs(node.y - expected_y_135) < self.snap_threshold:
-                candidates['diagonal_135'].append((node, node.x, node.y))
-        
-        return candidates
+    
+    def _alignment_indices(self, node_x, node_y, exclude_node=None):
+        """Return, per alignment kind, an index array into self.nodes of nodes aligned with the position"""
+        nx, ny, _, _ = self._node_arrays()
+        bins, cell = self._alignment_bins()
+        exclude = -1
+        if exclude_node:
+            # Nodes define no __eq__, so index() finds the excluded node by identity
+            try:
+                exclude = self.nodes.index(exclude_node)
+            except ValueError:
+                pass
+        threshold = self.snap_threshold
+        
+        # Drags and repaints repeat positions, especially when snapping to the grid
+        state = (len(self.nodes), exclude, threshold)
+        if self._align_memo_nodes is not self.nodes or self._align_memo_state != state:
+            self._align_memo.clear()
+            self._align_memo_nodes = self.nodes
+            self._align_memo_state = state
+            self._align_memo_node = exclude_node if exclude >= 0 else None
+        memo_key = (node_x, node_y)
+        indices = self._align_memo.get(memo_key)
+        if indices is not None:
+            return indices
+        
+        # Bins are wider than the threshold, so any match is filed in the query's own
+        # bin or a neighbouring one; only those nodes get the exact test
+        indices = {}
+        for kind, kind_bins, key in zip(_ALIGNMENT_KINDS, bins, self._bin_keys_at(node_x, node_y, cell)):
+            nearby = np.array(sorted(i for k in (key - 1, key, key + 1) for i in kind_bins.get(k, ())),
+                              dtype=np.intp)
+            nearby = nearby[nearby != exclude]
+            if kind == 'horizontal':
+                # Same Y
+                aligned = np.abs(ny[nearby] - node_y) < threshold
+            elif kind == 'vertical':
+                # Same X
+                aligned = np.abs(nx[nearby] - node_x) < threshold
+            elif kind == 'diagonal_45':
+                # On the line y - node_y = (x - node_x)
+                aligned = np.abs(ny[nearby] - (node_y + (nx[nearby] - node_x))) < threshold
+            else:
+                # On the line y - node_y = -(x - node_x)
+                aligned = np.abs(ny[nearby] - (node_y - (nx[nearby] - node_x))) < threshold
+            indices[kind] = nearby[aligned]
+        
+        if len(self._align_memo) >= ALIGNMENT_MEMO_SIZE:
+            self._align_memo.clear()
+        self._align_memo[memo_key] = indices
+        return indices
+    
+    @staticmethod
+    def _bin_keys_at(x, y, cell):
+        """Row, column, 45-degree and 135-degree bin keys of a position"""
+        return (math.floor(y / cell), math.floor(x / cell),
+                math.floor((y - x) / cell), math.floor((y + x) / cell))
+    
+    def _alignment_bins(self):
+        """Return (bins, cell size) for alignment queries, rebuilt when self.nodes or snap_threshold changes"""
+        cell = math.floor(self.snap_threshold) + 1  # Strictly wider than the threshold
+        if (self._bins_nodes is not self.nodes or len(self._bin_keys) != len(self.nodes) or
+                self._bins_cell != cell):
+            self._bins = tuple(defaultdict(list) for _ in _ALIGNMENT_KINDS)
+            self._bin_keys = []
+            for i, node in enumerate(self.nodes):
+                keys = self._bin_keys_at(node.x, node.y, cell)
+                for kind_bins, key in zip(self._bins, keys):
+                    kind_bins[key].append(i)
+                self._bin_keys.append(keys)
+            self._bins_nodes = self.nodes
+            self._bins_cell = cell
+        return self._bins, cell
+    
+    def _node_arrays(self):
+        """Return node centres and sizes as arrays (x, y, width, height), aligned with self.nodes"""
+        if self._arrays_nodes is not self.nodes or len(self._nx) != len(self.nodes):
+            count = len(self.nodes)
+            self._nx = np.fromiter((n.x for n in self.nodes), float, count)
+            self._ny = np.fromiter((n.y for n in self.nodes), float, count)
+            self._nw = np.fromiter((n.width for n in self.nodes), float, count)
+            self._nh = np.fromiter((n.height for n in self.nodes), float, count)
+            self._nnames = np.array([n.name for n in self.nodes], dtype=object)
+            self._arrays_nodes = self.nodes
+        return self._nx, self._ny, self._nw, self._nh
+    
+    def _node_cells(self, node):
+        """Grid cells touched by a node's bounds"""
+        left = int((node.x - node.half_width) // PICK_CELL_SIZE)
+        right = int((node.x + node.half_width) // PICK_CELL_SIZE)
+        top = int((node.y - node.half_height) // PICK_CELL_SIZE)
+        bottom = int((node.y + node.half_height) // PICK_CELL_SIZE)
+        return [(cx, cy) for cx in range(left, right + 1) for cy in range(top, bottom + 1)]
+    
+    def _node_grid(self):
+        """Return the pick grid mapping cells to node indices, rebuilt when self.nodes changes"""
+        if self._grid_nodes is not self.nodes or len(self._grid_cells) != len(self.nodes):
+            self._grid = defaultdict(list)
+            self._grid_cells = []
+            for i, node in enumerate(self.nodes):
+                cells = self._node_cells(node)
+                for cell in cells:
+                    self._grid[cell].append(i)
+                self._grid_cells.append(cells)
+            self._grid_nodes = self.nodes
+        return self._grid
+    
+    def _node_at(self, px, py):
+        """Return the topmost (last drawn) node containing the point, or None"""
+        cell = (int(px // PICK_CELL_SIZE), int(py // PICK_CELL_SIZE))
+        hits = [i for i in self._node_grid().get(cell, ()) if self.nodes[i].contains_point(px, py)]
+        return self.nodes[max(hits)] if hits else None
+    
+    def _node_moved(self, node):
+        """Update the geometry arrays, pick grid and alignment bins after a node changed position"""
+        self._export_cache = None
+        self._shown_code = None
+        if node is not self._align_memo_node:
+            self._align_memo.clear()
+        arrays_current = self._arrays_nodes is self.nodes and len(self._nx) == len(self.nodes)
+        grid_current = self._grid_nodes is self.nodes and len(self._grid_cells) == len(self.nodes)
+        bins_current = self._bins_nodes is self.nodes and len(self._bin_keys) == len(self.nodes)
+        if not (arrays_current or grid_current or bins_current):
+            return
+        i = self.nodes.index(node)
+        if arrays_current:
+            self._nx[i] = node.x
+            self._ny[i] = node.y
+        if grid_current:
+            for cell in self._grid_cells[i]:
+                self._grid[cell].remove(i)
+            cells = self._node_cells(node)
+            for cell in cells:
+                self._grid[cell].append(i)
+            self._grid_cells[i] = cells
+        if bins_current:
+            keys = self._bin_keys_at(node.x, node.y, self._bins_cell)
+            for kind_bins, old_key, key in zip(self._bins, self._bin_keys[i], keys):
+                if key != old_key:
+                    kind_bins[old_key].remove(i)
+                    kind_bins[key].append(i)
+            self._bin_keys[i] = keys
     
     def apply_strict_alignment(self, new_x, new_y):
         """Apply strict alignment snapping to horizontal, vertical, and diagonal lines"""
         if not self.snap_to_grid:
             return new_x, new_y
         
-        candidates = self.find_alignment_candidates(new_x, new_y, self.drag_node)
-        
-        # Priority: horizontal > vertical > diagonal
-        best_snap = None
-        best_distance = float('inf')
-        
-        # Check horizontal alignment
-        if candidates['horizontal']:
-            # Find the closest horizontal alignment
-            for node, align_y in candidates['horizontal']:
-                distance = abs(new_y - align_y)
-                if distance < best_distance:
-                    best_distance = distance
-                    best_snap = ('horizontal', new_x, align_y)
-        
-        # Check vertical alignment
-        if candidates['vertical']:
-            for node, align_x in candidates['vertical']:
-                distance = abs(new_x - align_x)
-                if distance < best_distance:
-                    best_distance = distance
-                    best_snap = ('vertical', align_x, new_y)
-        
-        # Check diagonal 45 degrees
-        if candidates['diagonal_45']:
-            for node, align_x, align_y in candidates['diagonal_45']:
-                # Calculate the 45-degree line: y = x + c, where c = align_y - align_x
-                c = align_y - align_x
-                # Project new position onto this line
-                # For point (new_x, new_y) and line y = x + c:
-                # Projected point: ((new_x + new_y - c) / 2, (new_x + new_y + c) / 2)
-                proj_x = (new_x + new_y - c) / 2
-                proj_y = proj_x + c
-                distance = math.sqrt((new_x - proj_x)**2 + (new_y - proj_y)**2)
-                if distance < best_distance:
-                    best_distance = distance
-                    best_snap = ('diagonal_45', proj_x, proj_y)
-        
-        # Check diagonal 135 degrees
-        if candidates['diagonal_135']:
-            for node, align_x, align_y in candidates['diagonal_135']:
-                # Calculate the 135-degree line: y = -x + c, where c = align_y + align_x
-                c = align_y + align_x
-                # Project new position onto this line
-                # For point (new_x, new_y) and line y = -x + c:
-                # Projected point: ((new_x - new_y + c) / 2, (-new_x + new_y + c) / 2)
-                proj_x = (new_x - new_y + c) / 2
-                proj_y = -proj_x + c
-                distance = math.sqrt((new_x - proj_x)**2 + (new_y - proj_y)**2)
-                if distance < best_distance:
-                    best_distance = distance
-                    best_snap = ('diagonal_135', proj_x, proj_y)
-        
-        # Apply the best snap if found
-        if best_snap and best_distance < self.snap_threshold:
-            snap_type, snap_x, snap_y = best_snap
-            # Also snap to grid for precision
-            snap_x = round(snap_x / self.grid_size) * self.grid_size
-            snap_y = round(snap_y / self.grid_size) * self.grid_size
-            return snap_x, snap_y
+        indices = self._alignment_indices(new_x, new_y, self.drag_node)
+        nx, ny, _, _ = self._node_arrays()
+        
+        # Squared distance and snap point for every candidate of every alignment kind,
+        # in priority order; squared distances order the same way, so no square roots are needed
+        
+        # Horizontal alignment keeps x and takes the node's y
+        horizontal = indices['horizontal']
+        h_snap_y = ny[horizontal]
+        h_d2 = (new_y - h_snap_y)**2
+        
+        # Vertical alignment takes the node's x and keeps y
+        vertical = indices['vertical']
+        v_snap_x = nx[vertical]
+        v_d2 = (new_x - v_snap_x)**2
+        
+        # Diagonal 45 degrees: project onto y = x + c, where c = align_y - align_x
+        # Projected point: ((new_x + new_y - c) / 2, (new_x + new_y + c) / 2)
+        diagonal_45 = indices['diagonal_45']
+        c = ny[diagonal_45] - nx[diagonal_45]
+        d45_snap_x = (new_x + new_y - c) * 0.5
+        d45_snap_y = d45_snap_x + c
+        d45_d2 = (new_x - d45_snap_x)**2 + (new_y - d45_snap_y)**2
+        
+        # Diagonal 135 degrees: project onto y = -x + c, where c = align_y + align_x
+        # Projected point: ((new_x - new_y + c) / 2, (-new_x + new_y + c) / 2)
+        diagonal_135 = indices['diagonal_135']
+        c = ny[diagonal_135] + nx[diagonal_135]
+        d135_snap_x = (new_x - new_y + c) * 0.5
+        d135_snap_y = -d135_snap_x + c
+        d135_d2 = (new_x - d135_snap_x)**2 + (new_y - d135_snap_y)**2
+        
+        all_d2 = np.concatenate((h_d2, v_d2, d45_d2, d135_d2))
+        
+        # Priority: horizontal > vertical > diagonal; argmin keeps the first of equally
+        # close candidates, so a later kind must be strictly closer
+        if all_d2.size:
+            k = int(all_d2.argmin())
+            if all_d2[k] < self.snap_threshold ** 2:
+                all_snap_x = np.concatenate((np.full(horizontal.size, new_x), v_snap_x, d45_snap_x, d135_snap_x))
+                all_snap_y = np.concatenate((h_snap_y, np.full(vertical.size, new_y), d45_snap_y, d135_snap_y))
+                snap_x, snap_y = float(all_snap_x[k]), float(all_snap_y[k])
+                # Also snap to grid for precision
+                snap_x = round(snap_x / self.grid_size) * self.grid_size
+                snap_y = round(snap_y / self.grid_size) * self.grid_size
+                return snap_x, snap_y
         
         # Fallback: just snap to grid
         return round(new_x / self.grid_size) * self.grid_size, round(new_y / self.grid_size) * self.grid_size
     
+    def _align_axis(self, node_coords, axis, threshold, grid_size_tikz):
+        """Give each group of nodes whose coordinates on axis lie within threshold of the group's
+        rounded key a shared value"""
+        snap_to_grid = self.snap_to_grid
+        # Keys are rounded to the grid when snapping, else to 0.5cm, and filed by step multiple
+        step = grid_size_tikz if snap_to_grid else 0.5
+        reach = int(threshold / step) + 2  # Multiples either side whose key could be within threshold
+        groups = {}  # Step multiple -> [key, creation order, names]
+        for name, coords in node_coords.items():
+            value = coords[axis]
+            multiple = round(value / step)
+            # Join the earliest created group whose key is within threshold
+            found = None
+            for k in range(multiple - reach, multiple + reach + 1):
+                group = groups.get(k)
+                if (group is not None and abs(value - group[0]) < threshold
+                        and (found is None or group[1] < found[1])):
+                    found = group
+            if found is not None:
+                found[2].append(name)
+            else:
+                groups[multiple] = [multiple * step, len(groups), [name]]
+        
+        # Merge groups whose keys are within threshold into the lowest such key; the kept
+        # keys that qualify are always the last few, as the keys arrive in ascending order
+        merged = []
+        for group in sorted(groups.values()):
+            j = len(merged)
+            while j and abs(group[0] - merged[j - 1][0]) < threshold:
+                j -= 1
+            if j < len(merged):
+                merged[j][2].extend(group[2])
+            else:
+                merged.append(group)
+        
+        # Nodes alone in their group keep their own value
+        for _, _, names in merged:
+            if len(names) > 1:
+                # Average for better alignment, rounded to grid if snapping
+                avg = sum(node_coords[name][axis] for name in names) / len(names)
+                if snap_to_grid:
+                    avg = round(avg / grid_size_tikz) * grid_size_tikz
+                else:
+                    avg = round(avg * 2) / 2  # Round to 0.5cm
+                for name in names:
+                    node_coords[name][axis] = avg
+    
     def get_tikz_code(self):
         """Generate TikZ code from current node positions, preserving original structure"""
         if not hasattr(self, 'original_code') or not self.original_code:
@@ -1366,19 +2024,31 @@ class TikZCanvas(QWidget):
         # Parse original code to preserve structure
         original = self.original_code
         
+        snap_to_grid = self.snap_to_grid
+        
+        # Nothing on the canvas has changed since the last export from this source
+        cache = self._export_cache
+        if cache is not None and cache[0] == original and cache[1] == snap_to_grid:
+            return cache[2]
+        
+        # Nothing on the canvas to write back (nothing parsed, or the canvas was cleared)
+        if not self.nodes:
+            return original
+        
         # Verify that original code contains the nodes we have (sanity check)
-        if self.nodes:
-            first_node_name = self.nodes[0].name
-            if first_node_name not in original:
-                # Original code doesn't match current nodes - this shouldn't happen
-                # but if it does, fall back to simple generation
-                print(f"Warning: Original code doesn't contain node '{first_node_name}', using simple generation")
-                return self._generate_simple_code()
+        first_node_name = self.nodes[0].name
+        if first_node_name not in original:
+            # Original code doesn't match current nodes - this shouldn't happen
+            # but if it does, fall back to simple generation
+            log.warning("Original code doesn't contain node %r, using simple generation", first_node_name)
+            return self._generate_simple_code()
         lines = original.split('\n')
         result_lines = []
         in_tikzpicture = False
         style_defs = []
         node_updates = {}  # Map node name to new position string
+        node_rects = None  # (node, rect) pairs, built on the first fit line and shared by the rest
+        lower_names = None  # Lowercased name -> node, built on the first unparsed node line
         
         # Build map of node positions
         # Use canvas center for coordinate conversion (same as parsing)
@@ -1387,23 +2057,29 @@ class TikZCanvas(QWidget):
         scale_factor = 50  # pixels per cm
         grid_size_pixels = self.grid_size  # Grid size in pixels (20)
         grid_size_tikz = grid_size_pixels / scale_factor  # Grid size in TikZ cm (0.4cm)
+        precision = 1 if snap_to_grid else 2  # Use precision that matches grid size
+        position_format = f"at ({{:.{precision}f}}cm,{{:.{precision}f}}cm)"  # Format spec parsed once
         
         # First pass: convert all coordinates and detect horizontal/vertical alignment
         node_coords = {}
         alignment_threshold_pixels = 2  # Consider nodes aligned if within 2 pixels
         alignment_threshold_tikz = alignment_threshold_pixels / scale_factor  # ~0.04cm
         
-        for node in self.nodes:
-            # Convert from pixel coordinates to TikZ coordinates
-            tikz_x = (node.x - canvas_center_x) / scale_factor
-            tikz_y = -(node.y - canvas_center_y) / scale_factor
-            
-            # If snap_to_grid was used, align to TikZ grid to preserve alignment
-            if self.snap_to_grid:
-                # Snap to nearest grid point in TikZ coordinates
-                tikz_x = round(tikz_x / grid_size_tikz) * grid_size_tikz
-                tikz_y = round(tikz_y / grid_size_tikz) * grid_size_tikz
-            
+        # Convert from pixel coordinates to TikZ coordinates for all nodes at once
+        count = len(self.nodes)
+        pixel_xs = np.fromiter((node.x for node in self.nodes), float, count)
+        pixel_ys = np.fromiter((node.y for node in self.nodes), float, count)
+        tikz_xs = (pixel_xs - canvas_center_x) / scale_factor
+        tikz_ys = -(pixel_ys - canvas_center_y) / scale_factor
+        
+        # If snap_to_grid was used, align to TikZ grid to preserve alignment
+        if snap_to_grid:
+            # Snap to nearest grid point in TikZ coordinates (half to even, like round());
+            # adding 0.0 turns -0.0 into 0.0 as round()'s integer result did
+            tikz_xs = np.round(tikz_xs / grid_size_tikz) * grid_size_tikz + 0.0
+            tikz_ys = np.round(tikz_ys / grid_size_tikz) * grid_size_tikz + 0.0
+        
+        for node, tikz_x, tikz_y in zip(self.nodes, tikz_xs.tolist(), tikz_ys.tolist()):
             node_coords[node.name] = {'x': tikz_x, 'y': tikz_y, 'pixel_y': node.y}
         
         # Second pass: detect and preserve horizontal and vertical alignment
@@ -1411,121 +2087,28 @@ class TikZCanvas(QWidget):
         # This helps catch nodes that are visually aligned but have small coordinate differences
         alignment_threshold_tikz_aggressive = 0.5  # 25 pixels = 0.5cm
         
-        # Group nodes by similar Y coordinates (horizontal alignment)
-        # Use clustering approach: group nodes that are close together
-        y_groups = {}
-        for name, coords in node_coords.items():
-            # Try to find existing group within threshold
-            found_group = None
-            for group_y in y_groups.keys():
-                if abs(coords['y'] - group_y) < alignment_threshold_tikz_aggressive:
-                    found_group = group_y
-                    break
-            
-            if found_group is not None:
-                y_groups[found_group].append(name)
-            else:
-                # Create new group - use rounded value for cleaner coordinates
-                if self.snap_to_grid:
-                    group_key = round(coords['y'] / grid_size_tikz) * grid_size_tikz
-                else:
-                    group_key = round(coords['y'] * 2) / 2  # Round to 0.5cm
-                y_groups[group_key] = [name]
-        
-        # Refine groups: merge groups that are very close together
-        y_group_list = sorted(y_groups.items())
-        merged_y_groups = {}
-        for group_y, node_names in y_group_list:
-            merged = False
-            for existing_y in merged_y_groups.keys():
-                if abs(group_y - existing_y) < alignment_threshold_tikz_aggressive:
-                    # Merge into existing group
-                    merged_y_groups[existing_y].extend(node_names)
-                    merged = True
-                    break
-            if not merged:
-                merged_y_groups[group_y] = node_names
-        
-        # Apply horizontal alignment: if multiple nodes are in the same group, use the group's Y
-        for group_y, node_names in merged_y_groups.items():
-            if len(node_names) > 1:
-                # Calculate average Y for better alignment
-                avg_y = sum(node_coords[name]['y'] for name in node_names) / len(node_names)
-                # Round to grid if snapping
-                if self.snap_to_grid:
-                    avg_y = round(avg_y / grid_size_tikz) * grid_size_tikz
-                else:
-                    avg_y = round(avg_y * 2) / 2  # Round to 0.5cm
-                # Use the group's Y for all nodes
-                for name in node_names:
-                    node_coords[name]['y'] = avg_y
-        
-        # Group nodes by similar X coordinates (vertical alignment)
-        # Use clustering approach: group nodes that are close together
-        x_groups = {}
-        for name, coords in node_coords.items():
-            # Try to find existing group within threshold
-            found_group = None
-            for group_x in x_groups.keys():
-                if abs(coords['x'] - group_x) < alignment_threshold_tikz_aggressive:
-                    found_group = group_x
-                    break
-            
-            if found_group is not None:
-                x_groups[found_group].append(name)
-            else:
-                # Create new group - use rounded value for cleaner coordinates
-                if self.snap_to_grid:
-                    group_key = round(coords['x'] / grid_size_tikz) * grid_size_tikz
-                else:
-                    group_key = round(coords['x'] * 2) / 2  # Round to 0.5cm
-                x_groups[group_key] = [name]
-        
-        # Refine groups: merge groups that are very close together
-        x_group_list = sorted(x_groups.items())
-        merged_x_groups = {}
-        for group_x, node_names in x_group_list:
-            merged = False
-            for existing_x in merged_x_groups.keys():
-                if abs(group_x - existing_x) < alignment_threshold_tikz_aggressive:
-                    # Merge into existing group
-                    merged_x_groups[existing_x].extend(node_names)
-                    merged = True
-                    break
-            if not merged:
-                merged_x_groups[group_x] = node_names
-        
-        # Apply vertical alignment: if multiple nodes are in the same group, use the group's X
-        for group_x, node_names in merged_x_groups.items():
-            if len(node_names) > 1:
-                # Calculate average X for better alignment
-                avg_x = sum(node_coords[name]['x'] for name in node_names) / len(node_names)
-                # Round to grid if snapping
-                if self.snap_to_grid:
-                    avg_x = round(avg_x / grid_size_tikz) * grid_size_tikz
-                else:
-                    avg_x = round(avg_x * 2) / 2  # Round to 0.5cm
-                # Use the group's X for all nodes
-                for name in node_names:
-                    node_coords[name]['x'] = avg_x
+        # A single node has nothing to align with
+        if len(node_coords) > 1:
+            # Horizontal alignment: nodes with similar Y coordinates share the group's Y
+            self._align_axis(node_coords, 'y', alignment_threshold_tikz_aggressive, grid_size_tikz)
+            # Vertical alignment: nodes with similar X coordinates share the group's X
+            self._align_axis(node_coords, 'x', alignment_threshold_tikz_aggressive, grid_size_tikz)
         
         # Final pass: format coordinates
         for node in self.nodes:
             coords = node_coords[node.name]
-            tikz_x = coords['x']
-            tikz_y = coords['y']
-            
-            # Use precision that matches grid size
-            precision = 1 if self.snap_to_grid else 2
-            node_updates[node.name] = f"at ({tikz_x:.{precision}f}cm,{tikz_y:.{precision}f}cm)"
-            print(f"Export: Node '{node.name}' - pixel: ({node.x:.2f}, {node.y:.2f}) -> TikZ: ({tikz_x:.{precision}f}cm, {tikz_y:.{precision}f}cm)")
+            node_updates[node.name] = position_format.format(coords['x'], coords['y'])
         
-        print(f"Export: Found {len(node_updates)} nodes to update: {list(node_updates.keys())}")
+        if log.isEnabledFor(logging.DEBUG):
+            # One record for the whole diagram rather than one per node
+            log.debug("Export: Found %d nodes to update:\n%s", len(node_updates), '\n'.join(
+                f"  {node.name!r} - pixel: ({node.x:.2f}, {node.y:.2f}) -> TikZ: {node_updates[node.name]}"
+                for node in self.nodes))
         
         i = 0
         while i < len(lines):
             line = lines[i]
-            stripped = line.strip()
+            indent, stripped = _split_indent(line)
             
             # Preserve tikzpicture opening with styles (may span multiple lines)
             if '\\begin{tikzpicture}' in stripped:
@@ -1544,19 +2127,15 @@ class TikZCanvas(QWidget):
             if '\\end{tikzpicture' in stripped:
                 in_tikzpicture = False
                 # Fix malformed \end{tikzpicture} (missing closing brace)
-                if not stripped.rstrip().endswith('}'):
-                    # Remove any trailing whitespace/newlines and add closing brace directly
-                    fixed_line = stripped.rstrip() + '}'
-                    if line.endswith('\n'):
-                        fixed_line += '\n'
-                    result_lines.append(fixed_line)
+                if not stripped.endswith('}'):
+                    result_lines.append(stripped + '}')
                 else:
                     result_lines.append(line)
                 i += 1
                 continue
             
             # Preserve style definitions (even if inside tikzpicture)
-            if '/.style=' in stripped or 'node distance=' in stripped:
+            if _STYLE_LINE_RE.search(stripped):
                 result_lines.append(line)
                 i += 1
                 continue
@@ -1568,9 +2147,7 @@ class TikZCanvas(QWidget):
                 continue
             
             # Preserve scope blocks, labels, background grouping, etc.
-            if any(keyword in stripped for keyword in ['\\begin{scope}', '\\end{scope}', 
-                                                       '\\node[font=', '\\draw[arrow', '\\draw[dashed',
-                                                       'on background layer', 'fit=']):
+            if _PRESERVED_LINE_RE.search(stripped):
                 result_lines.append(line)
                 i += 1
                 continue
@@ -1578,7 +2155,7 @@ class TikZCanvas(QWidget):
             # Update background groups (fit nodes) - these are editable now
             if '\\node[' in stripped and 'fit=' in stripped:
                 # Extract group name and fit nodes
-                fit_match = re.search(r'\\node\[([^\]]*)\]\s*\(([^)]+)\)\s*fit=\(([^)]+)\)', stripped)
+                fit_match = _FIT_NODE_RE.search(stripped)
                 if fit_match:
                     group_name = fit_match.group(2)
                     # Find matching background group
@@ -1586,10 +2163,11 @@ class TikZCanvas(QWidget):
                     if bg_group:
                         # Update fit nodes based on current group position and size
                         # Find nodes that are now within the group's bounds
+                        if node_rects is None:
+                            node_rects = [(node, node.get_rect()) for node in self.nodes]
                         updated_fit_nodes = []
                         group_rect = bg_group.get_rect()
-                        for node in self.nodes:
-                            node_rect = node.get_rect()
+                        for node, node_rect in node_rects:
                             # Check if node overlaps with group (with some tolerance)
                             if (node_rect.intersects(group_rect) or 
                                 group_rect.contains(node_rect.center())):
@@ -1604,9 +2182,8 @@ class TikZCanvas(QWidget):
                         # Preserve the style and other attributes
                         style_str = fit_match.group(1)
                         # Reconstruct: \node[style] (name) fit=(nodes) {text}
-                        text_match = re.search(r'\{([^}]*)\}', stripped)
+                        text_match = _BRACED_TEXT_RE.search(stripped)
                         text_content = text_match.group(1) if text_match else ""
-                        indent = len(line) - len(line.lstrip())
                         new_line = f"\\node[{style_str}] ({group_name}) fit=({fit_nodes_str}) {{{text_content}}}"
                         result_lines.append(' ' * indent + new_line)
                         i += 1
@@ -1618,9 +2195,9 @@ class TikZCanvas(QWidget):
                 continue
             
             # Update node positions - surgical approach: just replace the position part
-            if in_tikzpicture and '\\node[' in stripped and '(' in stripped:
+            if in_tikzpicture and '\\node[' in stripped:
                 # Extract node name - be more careful with the regex to ensure we match correctly
-                node_match = re.search(r'\\node\[([^\]]*)\]\s*\(([^)]+)\)', stripped)
+                node_match = _NODE_LINE_RE.search(stripped)
                 if node_match:
                     node_name = node_match.group(2).strip()
                     
@@ -1631,8 +2208,9 @@ class TikZCanvas(QWidget):
                         i += 1
                         continue
                     
-                    if node_name in node_updates:
-                        print(f"Export: Surgically updating node '{node_name}' position to {node_updates[node_name]}")
+                    position = node_updates.get(node_name)
+                    if position is not None:
+                        log.debug("Export: Surgically updating node %r position to %s", node_name, position)
                         
                         # Surgical approach: find the node name pattern and replace only the position part
                         # Pattern: \node[style] (name) [position/attributes] {text}
@@ -1642,33 +2220,29 @@ class TikZCanvas(QWidget):
                         
                         # First, try to replace ALL existing "at (x,y)" positions (remove duplicates)
                         # Replace all occurrences to prevent stacking, but preserve everything else
-                        new_line = re.sub(r'\s+at\s*\([^)]+\)', '', stripped)  # Remove all existing positions first
+                        new_line = _AT_POSITION_RE.sub('', stripped)  # Remove all existing positions first
                         # Then add the new position once
                         if new_line != stripped:
                             # Had existing position(s) - add new one before text brace or semicolon
                             # Make sure we preserve the node structure: \node[style] (name) ...
                             if '{' in new_line:
                                 # Insert position before text brace
-                                new_line = re.sub(r'(\([^)]+\))\s*(\{)', f"\\1 {node_updates[node_name]} \\2", new_line, count=1)
+                                new_line = _NAME_BEFORE_TEXT_RE.sub(f"\\1 {position} \\2", new_line, count=1)
                             elif ';' in new_line:
                                 # Insert position before semicolon
-                                new_line = re.sub(r'(\([^)]+\))\s*;', f"\\1 {node_updates[node_name]};", new_line, count=1)
+                                new_line = _NAME_BEFORE_SEMICOLON_RE.sub(f"\\1 {position};", new_line, count=1)
                             else:
                                 # No text or semicolon - add position at end
-                                new_line = new_line.rstrip() + f" {node_updates[node_name]}"
+                                new_line = new_line.rstrip() + f" {position}"
                             # Ensure line ends with semicolon if it should
                             if '{' not in new_line and not new_line.rstrip().endswith(';'):
                                 new_line = new_line.rstrip() + ';'
                             # Preserve original indentation
-                            indent = len(line) - len(line.lstrip())
                             result_lines.append(' ' * indent + new_line)
                             i += 1
                             continue
                         
                         # No "at (x,y)" found - need to remove relative positioning and insert absolute
-                        # Extract what comes after node name
-                        name_end_pos = node_match.end()
-                        after_name = stripped[name_end_pos:].strip()
                         
                         # Check if relative positioning is in style brackets
                         # Relative positioning keywords can appear in style brackets like: [code, below=of code-gen, yshift=-0.5cm]
@@ -1695,33 +2269,20 @@ class TikZCanvas(QWidget):
                             # Preserve original style exactly - don't modify it
                             cleaned_style = original_style_str
                         
-                        # Clean after_name - but preserve text content (everything starting with {)
-                        # Find where text content starts
-                        text_start = after_name.find('{')
-                        if text_start >= 0:
-                            # Has text content - separate attributes from text
-                            before_text = after_name[:text_start].strip()
-                            text_content = after_name[text_start:]  # Keep everything from { onwards
-                            
+                        # Reconstruct: \node[style] (name) at (x,y) ...
+                        # An empty style keeps empty brackets (valid TikZ syntax)
+                        if not cleaned_style.strip():
+                            cleaned_style = ''
+                        node_head = f"\\node[{cleaned_style}] ({node_name}) {position}"
+                        
+                        # Clean what follows the node name - but preserve text content (everything from the first {)
+                        before_text, text_content = node_match.group(3, 4)
+                        if text_content is not None:
                             # Remove relative positioning from before_text only
-                            # Use more precise regex that handles node names with hyphens, underscores, etc.
-                            before_text_clean = before_text
-                            before_text_clean = re.sub(r',\s*above=of\s+[\w-]+', '', before_text_clean)
-                            before_text_clean = re.sub(r',\s*below=of\s+[\w-]+', '', before_text_clean)
-                            before_text_clean = re.sub(r',\s*left=of\s+[\w-]+', '', before_text_clean)
-                            before_text_clean = re.sub(r',\s*right=of\s+[\w-]+', '', before_text_clean)
-                            before_text_clean = re.sub(r',\s*xshift=[^,{]+', '', before_text_clean)
-                            before_text_clean = re.sub(r',\s*yshift=[^,{]+', '', before_text_clean)
-                            before_text_clean = re.sub(r'^[\s,]+', '', before_text_clean)
+                            before_text_clean = _strip_relative_options(before_text)
                             
                             # Reconstruct: \node[style] (name) at (x,y) [before_text] {text}
-                            # Ensure style brackets are properly closed - style must be in brackets
-                            if not cleaned_style.strip():
-                                # Empty style - use empty brackets (valid TikZ syntax)
-                                new_line = f"\\node[] ({node_name}) {node_updates[node_name]}"
-                            else:
-                                # Ensure style doesn't have unclosed brackets
-                                new_line = f"\\node[{cleaned_style}] ({node_name}) {node_updates[node_name]}"
+                            new_line = node_head
                             if before_text_clean:
                                 new_line += f" {before_text_clean}"
                             new_line += f" {text_content}"
@@ -1730,23 +2291,10 @@ class TikZCanvas(QWidget):
                                 new_line = new_line.rstrip() + ';'
                         else:
                             # No text content - just attributes or semicolon
-                            # Use more precise regex that handles node names with hyphens, underscores, etc.
-                            after_name_clean = after_name
-                            after_name_clean = re.sub(r',\s*above=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*below=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*left=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*right=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*xshift=[^,{]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*yshift=[^,{]+', '', after_name_clean)
-                            after_name_clean = re.sub(r'^[\s,]+', '', after_name_clean)
+                            after_name_clean = _strip_relative_options(before_text)
                             
                             # Reconstruct: \node[style] (name) at (x,y) [rest]
-                            # Ensure style brackets are properly closed
-                            if not cleaned_style.strip():
-                                # Empty style - use empty brackets
-                                new_line = f"\\node[] ({node_name}) {node_updates[node_name]}"
-                            else:
-                                new_line = f"\\node[{cleaned_style}] ({node_name}) {node_updates[node_name]}"
+                            new_line = node_head
                             if after_name_clean:
                                 new_line += f" {after_name_clean}"
                             # Ensure line ends with semicolon
@@ -1754,142 +2302,152 @@ class TikZCanvas(QWidget):
                                 new_line = new_line.rstrip() + ';'
                         
                         # Preserve original indentation
-                        indent = len(line) - len(line.lstrip())
                         result_lines.append(' ' * indent + new_line)
                         i += 1
                         continue
                     else:
                         # Node exists in original code but wasn't parsed - try to give it a position
                         # Check if we can find a similar node name or try to resolve relative positioning
-                        print(f"Export: Node '{node_name}' wasn't parsed - attempting to resolve position")
+                        log.debug("Export: Node %r wasn't parsed - attempting to resolve position", node_name)
                         
                         # Try to find if there's a node with a similar name (case-insensitive, partial match)
-                        matching_node = None
-                        for node in self.nodes:
-                            if node.name.lower() == node_name.lower() or node.name.lower().endswith(node_name.lower()) or node_name.lower().endswith(node.name.lower()):
-                                matching_node = node
-                                break
+                        if lower_names is None:
+                            lower_names = {}
+                            for node in self.nodes:
+                                lower_names.setdefault(node.name.lower(), node)
+                        name_lower = node_name.lower()
+                        matching_node = lower_names.get(name_lower)
+                        if matching_node is None:
+                            for node_lower, node in lower_names.items():
+                                if node_lower.endswith(name_lower) or name_lower.endswith(node_lower):
+                                    matching_node = node
+                                    break
                         
                         if matching_node:
                             # Use the matching node's position
-                            tikz_x = (matching_node.x - 400) / 50
-                            tikz_y = -(matching_node.y - 300) / 50
-                            precision = 1 if self.snap_to_grid else 2
-                            position_str = f"at ({tikz_x:.{precision}f}cm,{tikz_y:.{precision}f}cm)"
-                            
-                            # Get the original style from the node_match - preserve it exactly
-                            original_style_from_match = node_match.group(1)
-                            
-                            # Try to update the line with absolute position
-                            # First, remove all existing positions
-                            cleaned_line = re.sub(r'\s+at\s*\([^)]+\)', '', stripped)
-                            
-                            # Remove relative positioning from AFTER the node name, not from style brackets
-                            # Find where node name ends
-                            name_end_pos = node_match.end()
-                            after_name = stripped[name_end_pos:].strip()
-                            
-                            # Remove relative positioning from after_name only
-                            # Use more precise regex that handles node names with hyphens, underscores, etc.
-                            after_name_clean = after_name
-                            after_name_clean = re.sub(r',\s*above=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*below=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*left=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*right=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*xshift=[^,{]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*yshift=[^,{]+', '', after_name_clean)
-                            after_name_clean = re.sub(r'^[\s,]+', '', after_name_clean)
-                            
-                            # Reconstruct: \node[original_style] (name) at (x,y) [after_name_clean]
-                            new_line = f"\\node[{original_style_from_match}] ({node_name}) {position_str}"
-                            if after_name_clean:
-                                new_line += f" {after_name_clean}"
-                            if not new_line.rstrip().endswith(';'):
-                                new_line = new_line.rstrip() + ';'
-                            
-                            indent = len(line) - len(line.lstrip())
-                            result_lines.append(' ' * indent + new_line)
-                            print(f"  Resolved unparsed node '{node_name}' using position from '{matching_node.name}'")
+                            tikz_x = (matching_node.x - canvas_center_x) / scale_factor
+                            tikz_y = -(matching_node.y - canvas_center_y) / scale_factor
+                            log.debug("Resolved unparsed node %r using position from %r", node_name, matching_node.name)
                         else:
                             # Can't find matching node - preserve original line but add default position
                             # Use center of canvas as fallback
-                            print(f"  Warning: Could not find matching node for '{node_name}', using default position")
-                            default_x = 0.0
-                            default_y = 0.0
-                            precision = 1 if self.snap_to_grid else 2
-                            position_str = f"at ({default_x:.{precision}f}cm,{default_y:.{precision}f}cm)"
-                            
-                            # Get the original style from the node_match - preserve it exactly
-                            original_style_from_match = node_match.group(1)
-                            
-                            # Remove all existing positions first
-                            cleaned_line = re.sub(r'\s+at\s*\([^)]+\)', '', stripped)
-                            
-                            # Find where node name ends
-                            name_end_pos = node_match.end()
-                            after_name = stripped[name_end_pos:].strip()
-                            
-                            # Remove relative positioning from after_name only (not from style)
-                            # Use more precise regex that handles node names with hyphens, underscores, etc.
-                            after_name_clean = after_name
-                            after_name_clean = re.sub(r',\s*above=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*below=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*left=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*right=of\s+[\w-]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*xshift=[^,{]+', '', after_name_clean)
-                            after_name_clean = re.sub(r',\s*yshift=[^,{]+', '', after_name_clean)
-                            after_name_clean = re.sub(r'^[\s,]+', '', after_name_clean)
-                            
-                            # Reconstruct: \node[original_style] (name) at (x,y) [after_name_clean]
-                            new_line = f"\\node[{original_style_from_match}] ({node_name}) {position_str}"
-                            if after_name_clean:
-                                new_line += f" {after_name_clean}"
-                            if not new_line.rstrip().endswith(';'):
-                                new_line = new_line.rstrip() + ';'
-                            
-                            indent = len(line) - len(line.lstrip())
-                            result_lines.append(' ' * indent + new_line)
+                            log.warning("Could not find matching node for %r, using default position", node_name)
+                            tikz_x = tikz_y = 0.0
+                        position_str = position_format.format(tikz_x, tikz_y)
+                        
+                        # Remove relative positioning from AFTER the node name, not from style brackets
+                        after_name_clean = _strip_relative_options(stripped[node_match.start(3):])
+                        
+                        # Reconstruct: \node[original_style] (name) at (x,y) [after_name_clean],
+                        # preserving the original style exactly
+                        new_line = f"\\node[{node_match.group(1)}] ({node_name}) {position_str}"
+                        if after_name_clean:
+                            new_line += f" {after_name_clean}"
+                        if not new_line.rstrip().endswith(';'):
+                            new_line = new_line.rstrip() + ';'
+                        
+                        result_lines.append(' ' * indent + new_line)
                         i += 1
                         continue
             
-            # Preserve draw commands (connections) - all draw commands
-            if '\\draw[' in stripped or stripped.startswith('\\draw'):
-                result_lines.append(line)
-                i += 1
-                continue
-            
-            # Preserve empty lines and other content
+            # Preserve draw commands (connections), empty lines and other content
             result_lines.append(line)
             i += 1
         
-        return '\n'.join(result_lines)
+        code = '\n'.join(result_lines)
+        self._export_cache = (original, snap_to_grid, code)
+        return code
     
     def _generate_simple_code(self):
         """Fallback simple code generation"""
-        code = "\\begin{tikzpicture}\n"
+        # Collected as parts and joined once rather than grown line by line
+        parts = ["\\begin{tikzpicture}\n"]
         
-        for node in self.nodes:
-            # Convert pixel coordinates back to TikZ coordinates
-            tikz_x = (node.x - 400) / 50
-            tikz_y = -(node.y - 300) / 50
-            
-            style_map = {
-                "ellipse": "cloud",
-                "cylinder": "db",
-                "dashed_rect": "k8s",
-                "yellow_rect": "api",
-                "rectangle": "service"
-            }
-            style = style_map.get(node.style_type, "service")
+        # Convert pixel coordinates back to TikZ coordinates for all nodes at once;
+        # adding 0.0 keeps nodes on the x axis at 0.00cm rather than -0.00cm
+        count = len(self.nodes)
+        tikz_xs = (np.fromiter((node.x for node in self.nodes), float, count) - 400) / 50
+        tikz_ys = -(np.fromiter((node.y for node in self.nodes), float, count) - 300) / 50 + 0.0
+        
+        for node, tikz_x, tikz_y in zip(self.nodes, tikz_xs.tolist(), tikz_ys.tolist()):
+            style = _STYLE_BY_TYPE.get(node.style_type, "service")
             
-            code += f"    \\node[{style}] ({node.name}) at ({tikz_x:.2f}cm,{tikz_y:.2f}cm) {{{node.text}}};\n"
+            parts.append(f"    \\node[{style}] ({node.name}) at ({tikz_x:.2f}cm,{tikz_y:.2f}cm) {{{node.text}}};\n")
         
         for conn in self.connections:
             style_str = "dashed" if conn.style == "dashed" else ""
-            code += f"    \\draw[{style_str}] ({conn.from_node.name}) -- ({conn.to_node.name});\n"
+            parts.append(f"    \\draw[{style_str}] ({conn.from_node.name}) -- ({conn.to_node.name});\n")
         
-        code += "\\end{tikzpicture}\n"
-        return code
+        parts.append("\\end{tikzpicture}\n")
+        return ''.join(parts)
+
+
+class FileReaderSignals(QObject):
+    """Signals a FileReader emits back to the GUI thread"""
+    finished = pyqtSignal(str, str)  # filename, text
+    failed = pyqtSignal(str, str)  # filename, error message
+
+
+class FileReader(QRunnable):
+    """Reads a TikZ file on a thread pool thread so large files don't block the window"""
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+        self.signals = FileReaderSignals()
+    
+    def run(self):
+        try:
+            text = Path(self.filename).read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError) as e:
+            self.signals.failed.emit(self.filename, str(e))
+            return
+        self.signals.finished.emit(self.filename, text)
+
+
+# Diagram loaded into the editor at startup
+_EXAMPLE_CODE = """\\begin{tikzpicture}[
+    node distance=1.5cm and 2cm,
+    cloud/.style={ellipse, draw, fill=blue!20, text width=3cm, text centered, minimum height=1.5cm, rounded corners, drop shadow},
+    service/.style={rectangle, draw, fill=orange!20, text width=2.5cm, text centered, minimum height=1cm, rounded corners},
+    db/.style={cylinder, draw, fill=purple!20, text width=2cm, text centered, minimum height=1.2cm, aspect=0.3},
+    k8s/.style={rectangle, draw, fill=green!20, text width=3cm, text centered, minimum height=1.5cm, rounded corners, dashed},
+    arrow/.style={->, >=stealth, thick},
+    api/.style={rectangle, draw, fill=yellow!20, text width=2.5cm, text centered, minimum height=1cm, rounded corners}
+]
+    \\node[cloud] (aws) at (-6,3) {\\textbf{AWS}\\\\small EC2 GPU};
+    \\node[cloud] (gcp) at (-1.3,3) {\\textbf{GCP}\\\\small Compute};
+    \\node[cloud] (azure) at (1.3,3) {\\textbf{Azure}\\\\small NC VMs};
+    \\node[cloud] (aliyun) at (6,3) {\\textbf{阿里云}\\\\small Alibaba};
+    \\node[cloud] (tencent) at (-6,1.5) {\\textbf{腾讯云}\\\\small Tencent};
+    \\node[cloud] (huawei) at (6,1.5) {\\textbf{华为云}\\\\small Huawei};
+    \\node[cloud, above=of gcp, yshift=0.5cm] (openai) {OpenAI\\\\GPT-4};
+    \\node[cloud, right=of openai, xshift=1cm] (anthropic) {Anthropic\\\\Claude};
+    \\node[k8s] (k8s) at (0,0) {\\textbf{Kubernetes}\\\\small Multi-Cloud};
+    \\node[service, below=of k8s, xshift=-2.5cm] (llama) {Llama 3.1\\\\70B (vLLM)};
+    \\node[service, below=of k8s, xshift=-0.8cm] (langflow) {LangFlow\\\\Orchestrator};
+    \\node[service, below=of k8s, xshift=0.8cm] (fastapi) {FastAPI\\\\Service};
+    \\node[service, below=of k8s, xshift=2.5cm] (ollama) {Ollama\\\\Models};
+    \\node[api, above=of k8s, yshift=-0.3cm] (gateway) {\\textbf{API Gateway}\\\\small Multi-Cloud};
+    \\node[db, below=of llama, yshift=-0.5cm] (weaviate) {Weaviate\\\\Vector DB};
+    \\node[db, below=of fastapi, yshift=-0.5cm] (postgres) {PostgreSQL\\\\Managed};
+    \\node[db, below=of ollama, yshift=-0.5cm] (storage) {Object\\\\Storage};
+    \\draw[arrow, dashed] (aws) -- (k8s);
+    \\draw[arrow, dashed] (gcp) -- (k8s);
+    \\draw[arrow, dashed] (azure) -- (k8s);
+    \\draw[arrow, dashed] (aliyun) -- (k8s);
+    \\draw[arrow, dashed] (tencent) -- (k8s);
+    \\draw[arrow, dashed] (huawei) -- (k8s);
+    \\draw[arrow] (gateway) -- (k8s);
+    \\draw[arrow] (k8s) -- (llama);
+    \\draw[arrow] (k8s) -- (langflow);
+    \\draw[arrow] (k8s) -- (fastapi);
+    \\draw[arrow] (k8s) -- (ollama);
+    \\draw[arrow] (langflow) -- (openai);
+    \\draw[arrow] (langflow) -- (anthropic);
+    \\draw[arrow] (llama) -- (weaviate);
+    \\draw[arrow] (fastapi) -- (postgres);
+    \\draw[arrow] (ollama) -- (storage);
+\\end{tikzpicture}"""
 
 
 class MainWindow(QMainWindow):
@@ -1900,6 +2458,12 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("TikZ Diagram Editor")
         self.setGeometry(100, 100, 1400, 900)
         
+        # FileReader for the file being opened, if any
+        self._file_reader = None
+        
+        # Exception from the last failed render; its traceback is only formatted on request
+        self._last_render_error = None
+        
         # Create central widget
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -1978,6 +2542,9 @@ class MainWindow(QMainWindow):
         
         # Connect signals
         self.canvas.position_changed.connect(self.update_code_from_canvas)
+        self.canvas.parsed.connect(self.show_diagram_status)
+        self.canvas.parse_failed.connect(self.show_parse_error)
+        self.code_editor.textChanged.connect(self.on_code_changed)
         
         # Store reference to main window in canvas for zoom label updates
         self.canvas.main_window = self
@@ -2033,50 +2600,7 @@ class MainWindow(QMainWindow):
     
     def load_example(self):
         """Load example TikZ code"""
-        example_code = """\\begin{tikzpicture}[
-    node distance=1.5cm and 2cm,
-    cloud/.style={ellipse, draw, fill=blue!20, text width=3cm, text centered, minimum height=1.5cm, rounded corners, drop shadow},
-    service/.style={rectangle, draw, fill=orange!20, text width=2.5cm, text centered, minimum height=1cm, rounded corners},
-    db/.style={cylinder, draw, fill=purple!20, text width=2cm, text centered, minimum height=1.2cm, aspect=0.3},
-    k8s/.style={rectangle, draw, fill=green!20, text width=3cm, text centered, minimum height=1.5cm, rounded corners, dashed},
-    arrow/.style={->, >=stealth, thick},
-    api/.style={rectangle, draw, fill=yellow!20, text width=2.5cm, text centered, minimum height=1cm, rounded corners}
-]
-    \\node[cloud] (aws) at (-6,3) {\\textbf{AWS}\\\\small EC2 GPU};
-    \\node[cloud] (gcp) at (-1.3,3) {\\textbf{GCP}\\\\small Compute};
-    \\node[cloud] (azure) at (1.3,3) {\\textbf{Azure}\\\\small NC VMs};
-    \\node[cloud] (aliyun) at (6,3) {\\textbf{阿里云}\\\\small Alibaba};
-    \\node[cloud] (tencent) at (-6,1.5) {\\textbf{腾讯云}\\\\small Tencent};
-    \\node[cloud] (huawei) at (6,1.5) {\\textbf{华为云}\\\\small Huawei};
-    \\node[cloud, above=of gcp, yshift=0.5cm] (openai) {OpenAI\\\\GPT-4};
-    \\node[cloud, right=of openai, xshift=1cm] (anthropic) {Anthropic\\\\Claude};
-    \\node[k8s] (k8s) at (0,0) {\\textbf{Kubernetes}\\\\small Multi-Cloud};
-    \\node[service, below=of k8s, xshift=-2.5cm] (llama) {Llama 3.1\\\\70B (vLLM)};
-    \\node[service, below=of k8s, xshift=-0.8cm] (langflow) {LangFlow\\\\Orchestrator};
-    \\node[service, below=of k8s, xshift=0.8cm] (fastapi) {FastAPI\\\\Service};
-    \\node[service, below=of k8s, xshift=2.5cm] (ollama) {Ollama\\\\Models};
-    \\node[api, above=of k8s, yshift=-0.3cm] (gateway) {\\textbf{API Gateway}\\\\small Multi-Cloud};
-    \\node[db, below=of llama, yshift=-0.5cm] (weaviate) {Weaviate\\\\Vector DB};
-    \\node[db, below=of fastapi, yshift=-0.5cm] (postgres) {PostgreSQL\\\\Managed};
-    \\node[db, below=of ollama, yshift=-0.5cm] (storage) {Object\\\\Storage};
-    \\draw[arrow, dashed] (aws) -- (k8s);
-    \\draw[arrow, dashed] (gcp) -- (k8s);
-    \\draw[arrow, dashed] (azure) -- (k8s);
-    \\draw[arrow, dashed] (aliyun) -- (k8s);
-    \\draw[arrow, dashed] (tencent) -- (k8s);
-    \\draw[arrow, dashed] (huawei) -- (k8s);
-    \\draw[arrow] (gateway) -- (k8s);
-    \\draw[arrow] (k8s) -- (llama);
-    \\draw[arrow] (k8s) -- (langflow);
-    \\draw[arrow] (k8s) -- (fastapi);
-    \\draw[arrow] (k8s) -- (ollama);
-    \\draw[arrow] (langflow) -- (openai);
-    \\draw[arrow] (langflow) -- (anthropic);
-    \\draw[arrow] (llama) -- (weaviate);
-    \\draw[arrow] (fastapi) -- (postgres);
-    \\draw[arrow] (ollama) -- (storage);
-\\end{tikzpicture}"""
-        self.code_editor.setPlainText(example_code)
+        self.code_editor.setPlainText(_EXAMPLE_CODE)
         self.render_diagram()
     
     def load_code(self):
@@ -2089,14 +2613,42 @@ class MainWindow(QMainWindow):
         try:
             # Always update original_code when rendering a new diagram
             self.canvas.parse_tikz_code(code)
-            node_count = len(self.canvas.nodes)
-            conn_count = len(self.canvas.connections)
-            self.statusBar.showMessage(f"Diagram rendered: {node_count} nodes, {conn_count} connections")
+            self.show_diagram_status()
         except Exception as e:
-            import traceback
-            error_msg = f"Failed to parse TikZ code: {str(e)}\n{traceback.format_exc()}"
-            QMessageBox.warning(self, "Error", error_msg)
-            self.statusBar.showMessage(f"Error: {str(e)}")
+            self._last_render_error = e
+            self.show_parse_error(str(e))
+            box = QMessageBox(QMessageBox.Warning, "Error", f"Failed to parse TikZ code: {str(e)}",
+                              QMessageBox.Ok, self)
+            details_btn = box.addButton("Show Details", QMessageBox.ActionRole)
+            box.exec_()
+            if box.clickedButton() is details_btn:
+                self.show_render_error_details()
+    
+    def show_render_error_details(self):
+        """Show the full traceback of the last failed render"""
+        e = self._last_render_error
+        if e is None:
+            return
+        details = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+        QMessageBox.warning(self, "Error Details", f"Failed to parse TikZ code: {str(e)}\n{details}")
+    
+    def show_diagram_status(self):
+        """Report the node and connection counts of the rendered diagram"""
+        node_count = len(self.canvas.nodes)
+        conn_count = len(self.canvas.connections)
+        self.statusBar.showMessage(f"Diagram rendered: {node_count} nodes, {conn_count} connections")
+    
+    def show_parse_error(self, error):
+        """Report a parse error in the status bar"""
+        self.statusBar.showMessage(f"Error: {error}")
+    
+    def on_code_changed(self):
+        """Re-parse the diagram shortly after the user stops typing"""
+        if self.canvas.has_unexported_edits:
+            # Re-parsing would discard the moved positions
+            self.statusBar.showMessage("Canvas has unexported changes - export them or click Render Diagram")
+            return
+        self.canvas.request_parse(self.code_editor.toPlainText())
     
     def update_code_from_canvas(self):
         """Update code editor when canvas changes"""
@@ -2107,7 +2659,7 @@ class MainWindow(QMainWindow):
     def toggle_grid(self, state):
         """Toggle grid display"""
         self.canvas.show_grid = (state == Qt.Checked)
-        self.canvas.update()
+        self.canvas.invalidate_scene()
     
     def toggle_snap(self, state):
         """Toggle grid snapping during drag"""
@@ -2116,14 +2668,20 @@ class MainWindow(QMainWindow):
     def zoom_in(self):
         """Zoom in"""
         self.canvas.zoom_level = min(self.canvas.max_zoom, self.canvas.zoom_level * 1.2)
-        self.zoom_label.setText(f"{int(self.canvas.zoom_level * 100)}%")
-        self.canvas.update()
+        self._update_zoom_label()
+        self.canvas.invalidate_scene()
     
     def zoom_out(self):
         """Zoom out"""
         self.canvas.zoom_level = max(self.canvas.min_zoom, self.canvas.zoom_level / 1.2)
-        self.zoom_label.setText(f"{int(self.canvas.zoom_level * 100)}%")
-        self.canvas.update()
+        self._update_zoom_label()
+        self.canvas.invalidate_scene()
+    
+    def _update_zoom_label(self):
+        """Show the canvas zoom level as a whole percentage"""
+        percent = int(self.canvas.zoom_level * 100)
+        label = _ZOOM_LABELS.get(percent)
+        self.zoom_label.setText(label if label is not None else f"{percent}%")
     
     def reset_zoom(self):
         """Reset zoom and pan"""
@@ -2131,7 +2689,7 @@ class MainWindow(QMainWindow):
         self.canvas.offset_x = 0
         self.canvas.offset_y = 0
         self.zoom_label.setText("100%")
-        self.canvas.update()
+        self.canvas.invalidate_scene()
     
     def export_code(self):
         """Export updated TikZ code"""
@@ -2146,9 +2704,17 @@ class MainWindow(QMainWindow):
         # Always use current node positions from canvas (user's edits)
         # get_tikz_code will use self.nodes which has the current positions
         code = self.canvas.get_tikz_code()
-        self.code_editor.setPlainText(code)
+        # Replacing the text re-lays out the whole document, so skip it when nothing changed
+        if code != self.code_editor.toPlainText():
+            # The canvas already shows this code, so don't schedule a re-parse of it
+            self.code_editor.blockSignals(True)
+            self.code_editor.setUpdatesEnabled(False)
+            self.code_editor.setPlainText(code)
+            self.code_editor.setUpdatesEnabled(True)
+            self.code_editor.blockSignals(False)
         # Update original_code to the newly exported code so next export uses it as base
         self.canvas.original_code = code
+        self.canvas.has_unexported_edits = False
         self.statusBar.showMessage("Code updated from visual editor")
     
     def open_file(self):
@@ -2156,17 +2722,31 @@ class MainWindow(QMainWindow):
         filename, _ = QFileDialog.getOpenFileName(
             self, "Open TikZ File", "", "LaTeX Files (*.tex);;All Files (*)")
         if filename:
-            with open(filename, 'r', encoding='utf-8') as f:
-                self.code_editor.setPlainText(f.read())
-            self.render_diagram()
+            # Keep a reference so the reader's signals outlive the pool's own handle
+            self._file_reader = FileReader(filename)
+            self._file_reader.signals.finished.connect(self._on_file_read)
+            self._file_reader.signals.failed.connect(self._on_file_read_failed)
+            self.statusBar.showMessage(f"Opening {filename}...")
+            QThreadPool.globalInstance().start(self._file_reader)
+    
+    def _on_file_read(self, filename, text):
+        """Show a file read by FileReader and render it"""
+        self._file_reader = None
+        self.code_editor.setPlainText(text)
+        self.render_diagram()
+    
+    def _on_file_read_failed(self, filename, error):
+        """Report a file FileReader could not read"""
+        self._file_reader = None
+        QMessageBox.warning(self, "Error", f"Failed to open {filename}: {error}")
+        self.statusBar.showMessage(f"Error: {error}")
     
     def save_file(self):
         """Save TikZ file"""
         filename, _ = QFileDialog.getSaveFileName(
             self, "Save TikZ File", "", "LaTeX Files (*.tex);;All Files (*)")
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.code_editor.toPlainText())
+            Path(filename).write_text(self.code_editor.toPlainText(), encoding='utf-8')
             self.statusBar.showMessage(f"Saved to {filename}")
     
     def clear_all(self):
@@ -2174,11 +2754,17 @@ class MainWindow(QMainWindow):
         self.code_editor.clear()
         self.canvas.nodes = []
         self.canvas.connections = []
-        self.canvas.update()
+        self.canvas.has_unexported_edits = False
+        self.canvas.invalidate_scene()
 
 
 def main():
+    # Set TIKZ_EDITOR_LOG_LEVEL=DEBUG to trace parsing and export
+    logging.basicConfig(level=os.environ.get("TIKZ_EDITOR_LOG_LEVEL", "WARNING").upper(),
+                        format="%(levelname)s %(message)s")
     app = QApplication(sys.argv)
+    # Node pixmaps are cached per zoom level; give the cache room for large diagrams
+    QPixmapCache.setCacheLimit(50 * 1024)
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())